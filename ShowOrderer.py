@@ -1,13 +1,34 @@
 from z3 import *
+import numpy
 import numpy.random
+import concurrent.futures
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
 
 class Actor:
+    __slots__ = ("name",)
+
     def __init__(self, name: str):
         if not (isinstance(name, str)):
             raise TypeError("Actor name must be a string")
         self.name = name
 
 class Sketch:
+    __slots__ = ("name", "actors")
+
     def __init__(self, name, actors):
         if not (isinstance(name, str)):
             raise TypeError("Sketch name must be a string")
@@ -25,10 +46,14 @@ class Sketch:
         self.actors = actors
 
 class Diddy(Sketch):
+    __slots__ = ()
+
     def __init__(self, name, actors):
         super().__init__(name, actors)
 
 class Vignettes(Sketch):
+    __slots__ = ()
+
     def __init__(self, name, actors):
         if not (isinstance(name, str)):
             raise TypeError("Name of vignettes must be a string")
@@ -50,27 +75,943 @@ class Vignettes(Sketch):
         self.name = name
         self.actors = actors
 
-#I'm sure this data structure exists but I don't know what it's called, so I'm making it myself
-#Functions like a hash map but every key maps to a list of values. You can add to but not remove from list. You can get entire list at once.
-class HashBag:
-    def __init__(self):
-        self.map = {}
+#helper to list the individually placed items of a sketch as (name, actors) pairs
+#every vignette in a set is its own item, named after the set plus its number in the set (e.g. "Doordash 2")
+def sketchItems(sketch):
+    if isinstance(sketch, Vignettes):
+        return [(sketch.name + " " + str(i + 1), vignette_actors) for (i, vignette_actors) in enumerate(sketch.actors)]
+    return [(sketch.name, sketch.actors)]
+
+#A show compiled down to integer ids, built once per ShowOrderer so the encoders, the local search, scoring and input checks
+#don't walk the sketch objects again: item i is names[i] (every vignette in a set is its own item), actor a is actorNames[a]
+#(actors are told apart by name), casts[i] lists the actors of item i in the order they were given, incidence[a, i] is 1 if
+#actor a is in item i, kinds[i] is SKETCH, VIGNETTE or DIDDY,
+#sizes[i] is the number of actors in item i, shared[i, j] is the number of actors items i and j have in common, and
+#vignetteSets lists the items of every set of vignettes in order
+class CompiledShow:
+    __slots__ = ("names", "index", "actorNames", "actorIndex", "casts", "incidence", "kinds", "sizes", "shared", "vignetteSets",
+                 "sketchIds")
+    SKETCH, VIGNETTE, DIDDY = 0, 1, 2
+    KIND_NAMES = ["sketch", "vignette", "diddy"]
+
+    def __init__(self, sketches):
+        self.names = []
+        self.actorNames = []
+        self.actorIndex = {}
+        self.vignetteSets = []
+        self.sketchIds = set(id(sketch) for sketch in sketches) #the sketch objects themselves, for input checking
+        self.casts = []
+        kinds = []
+        for sketch in sketches:
+            kind = self.VIGNETTE if isinstance(sketch, Vignettes) else self.DIDDY if isinstance(sketch, Diddy) else self.SKETCH
+            items = sketchItems(sketch)
+            if kind == self.VIGNETTE:
+                self.vignetteSets.append(list(range(len(self.names), len(self.names) + len(items))))
+            for (name, actors) in items:
+                self.names.append(name)
+                kinds.append(kind)
+                self.casts.append([self.actorId(actor.name) for actor in actors])
+        self.index = {name: i for (i, name) in enumerate(self.names)}
+
+        self.incidence = numpy.zeros((len(self.actorNames), len(self.names)), dtype = numpy.int32)
+        for (i, actorIds) in enumerate(self.casts):
+            self.incidence[actorIds, i] = 1
+        self.kinds = numpy.array(kinds, dtype = numpy.int8)
+        self.sizes = self.incidence.sum(axis = 0)
+        self.shared = self.incidence.T @ self.incidence
+        numpy.fill_diagonal(self.shared, 0)
+
+    def actorId(self, actorName):
+        if not (actorName in self.actorIndex):
+            self.actorIndex[actorName] = len(self.actorNames)
+            self.actorNames.append(actorName)
+        return self.actorIndex[actorName]
+
+    #names of the actors in an item
+    def cast(self, name):
+        return [self.actorNames[a] for a in self.casts[self.index[name]]]
+
+#An encoding decides how positions in the show are represented in z3. Constraints in orderShow are written against item names
+#(sketch names, vignette names like "Doordash 2" and block separators like "Block 1"), and the encoding turns each question
+#("are these adjacent?", "is this in block 2?") into a z3 expression over its own variables.
+class Encoding:
+    def __init__(self, names, blockNames):
+        if not (isinstance(names, list) and isinstance(blockNames, list)):
+            raise TypeError("Please provide lists of item names and block separator names")
+        self.names = names
+        self.blockNames = blockNames
+        self.n_total = len(names) + len(blockNames) #how many total positions there are to fill
+
+    def tripleChange(self, x, y, z):
+        return Or(And(self.adjacent(x, y), self.adjacent(y, z)), And(self.adjacent(y, x), self.adjacent(x, z)),
+                  And(self.adjacent(y, z), self.adjacent(z, x)))
+
+    def first(self, x):
+        return self.at(x, 1)
+
+    def last(self, x):
+        return self.at(x, self.n_total)
+
+    def differentBlocks(self, x, y):
+        separators = []
+        for block in self.blockNames:
+            separators.append(Or(And(self.before(x, block), self.before(block, y)), And(self.before(y, block), self.before(block, x))))
+        return Or(separators)
+
+    def notInFirstBlock(self, x):
+        return self.before(self.blockNames[0], x)
+
+#Original encoding: every sketch, vignette and block separator gets one z3 int holding its position in the show,
+#and positions are kept unique with a != constraint between every pair of variables
+class IntEncoding(Encoding):
+    def __init__(self, names, blockNames):
+        super().__init__(names, blockNames)
+        self.vars = {}
+        for name in names + blockNames:
+            self.vars[name] = Int(name)
+        #which block each sketch is in (0 for the first block), so block questions don't have to go back to the separators
+        #(fresh constants, so they can't be the same z3 constant as the position of a sketch that happens to be named "<name> block")
+        self.blockOf = {}
+        for name in names:
+            self.blockOf[name] = FreshInt(name + " block")
+
+    #every variable must be assigned to a unique and valid position
+    def positions(self):
+        constraints = []
+        all_vars = list(self.vars.values())
+        for i in range(len(all_vars)):
+            var1 = all_vars[i]
+            constraints.append(var1 >= 1)
+            constraints.append(var1 <= self.n_total)
+            for j in range(i + 1, len(all_vars)):
+                var2 = all_vars[j]
+                constraints.append(var1 != var2)
+
+        #a sketch's block number is how many block separators come before it
+        #(block separators are kept in order by blockSizing, so "after separator k" is the same as "block number >= k")
+        for name in self.names:
+            constraints.append(self.blockOf[name] >= 0)
+            constraints.append(self.blockOf[name] <= len(self.blockNames))
+            for (k, block) in enumerate(self.blockNames):
+                constraints.append((self.blockOf[name] >= k + 1) == (self.vars[name] > self.vars[block]))
+        return constraints
+
+    def adjacent(self, x, y):
+        x, y = self.vars[x], self.vars[y]
+        return Or(x - y == 1, x - y == -1)
+
+    def before(self, x, y):
+        return self.vars[x] < self.vars[y]
+
+    def at(self, x, position):
+        return self.vars[x] == position
+
+    #block numbers start at 0 for the first block
+    def inBlock(self, x, blockNum):
+        return self.blockOf[x] == blockNum
+
+    def differentBlocks(self, x, y):
+        return self.blockOf[x] != self.blockOf[y]
+
+    def notInFirstBlock(self, x):
+        return self.blockOf[x] >= 1
+
+    def blockStart(self, x):
+        constraints = [self.vars[x] == 1]
+        for block in self.blockNames:
+            constraints.append(self.vars[x] == self.vars[block] + 1)
+        return Or(constraints)
+
+    def blockEnd(self, x):
+        constraints = [self.vars[x] == self.n_total]
+        for block in self.blockNames:
+            constraints.append(self.vars[x] == self.vars[block] - 1)
+        return Or(constraints)
+
+    #make sure blocks are evenly sized; lengths are counted in half sketches so everything stays integer
+    def blockSizing(self, shortNames):
+        if self.n_total < len(self.blockNames) + len(shortNames):
+            raise ValueError("There must be at least as many positions as block separators plus vignettes and diddies")
+        blocks = [self.vars[block] for block in self.blockNames]
+        blocks.insert(0, 0)
+        blocks.append(self.n_total + 1)
+
+        #compute length of each block in half sketches: twice the gap between its separators, minus 1 for every vignette/diddy in it
+        block_lengths = []
+        for block_num in range(1, len(blocks)):
+            shortInBlock = [self.inBlock(short_sketch, block_num - 1) for short_sketch in shortNames]
+            length = 2 * (blocks[block_num] - blocks[block_num - 1] - 1)
+            if len(shortInBlock) > 0:
+                length = length - Sum([If(inBlock, 1, 0) for inBlock in shortInBlock])
+            block_lengths.append(length)
+
+        #ensure lengths are within 1 sketch (2 half sketches) of one another
+        length_conditions = []
+        for i in range(len(block_lengths)):
+            for j in range(i + 1, len(block_lengths)):
+                length_conditions.append(block_lengths[i] - block_lengths[j] <= 2)
+                length_conditions.append(block_lengths[i] - block_lengths[j] >= -2)
+
+        #no empty blocks, and block variables are in correct order
+        for block_num in range(1, len(blocks)):
+            length_conditions.append(blocks[block_num] - blocks[block_num - 1] > 1)
+
+        return And(length_conditions)
+
+    def atMostOnePerBlock(self, names):
+        constraints = []
+        if len(names) < 2:
+            return constraints
+        for blockNum in range(len(self.blockNames) + 1):
+            constraints.append(AtMost(*([self.inBlock(name, blockNum) for name in names] + [1])))
+        return constraints
+
+    #starting values for every position and block number variable, taken from a complete show order
+    def initialValues(self, showOrder):
+        values = [(self.vars[name], p + 1) for (p, name) in enumerate(showOrder)]
+        blockNum = 0
+        for name in showOrder:
+            if name in self.blockOf:
+                values.append((self.blockOf[name], blockNum))
+            else:
+                blockNum += 1
+        return values
+
+    def decode(self, model):
+        if len(model) == 0:
+            return None
+        numsToSketches = {}
+        for name, var in self.vars.items():
+            numsToSketches[model.eval(var).as_long()] = name
+        return [numsToSketches[i] for i in range(1, self.n_total + 1)]
+
+#Boolean encoding: a one-hot item x position matrix with exactly-one constraints on every row and column.
+#Adjacency and block membership become plain Boolean lookups instead of integer-difference reasoning.
+class BoolEncoding(Encoding):
+    def __init__(self, names, blockNames):
+        super().__init__(names, blockNames)
+        self.slots = range(1, self.n_total + 1)
+        self.vars = {}   #item name -> [None, placed at 1, placed at 2, ...]
+        self.upTo = {}   #item name -> [None, placed at or before 1, placed at or before 2, ...]
+        for name in names + blockNames:
+            self.vars[name] = [None] + [Bool(name + " @ " + str(p)) for p in self.slots]
+            self.upTo[name] = [None] + [Bool(name + " @ <=" + str(p)) for p in self.slots]
+        self.separator = [None] + [Bool("Separator @ " + str(p)) for p in self.slots]
+        self.adjacency = {} #adjacency expressions are reused heavily by quick change constraints, so only build each one once
+
+    #every item gets exactly one position and every position gets exactly one item
+    def positions(self):
+        constraints = []
+        for name in self.vars:
+            constraints.append(PbEq([(self.vars[name][p], 1) for p in self.slots], 1))
+            constraints.append(self.upTo[name][1] == self.vars[name][1])
+            for p in self.slots[1:]:
+                constraints.append(self.upTo[name][p] == Or(self.upTo[name][p - 1], self.vars[name][p]))
+        for p in self.slots:
+            constraints.append(PbEq([(self.vars[name][p], 1) for name in self.vars], 1))
+            constraints.append(self.separator[p] == Or([self.vars[block][p] for block in self.blockNames]))
+        return constraints
+
+    def adjacent(self, x, y):
+        key = (x, y) if x < y else (y, x)
+        if not (key in self.adjacency):
+            x, y = self.vars[x], self.vars[y]
+            self.adjacency[key] = Or([Or(And(x[p], y[p + 1]), And(y[p], x[p + 1])) for p in self.slots[:-1]])
+        return self.adjacency[key]
+
+    def before(self, x, y):
+        return Or([And(self.vars[x][p], Not(self.upTo[y][p])) for p in self.slots])
+
+    def at(self, x, position):
+        return self.vars[x][position]
+
+    #is position p inside the block with the given number (0 for the first block)?
+    def _slotInBlock(self, p, blockNum):
+        conditions = []
+        if blockNum > 0:
+            conditions.append(BoolVal(False) if p == 1 else self.upTo[self.blockNames[blockNum - 1]][p - 1])
+        if blockNum < len(self.blockNames):
+            conditions.append(Not(self.upTo[self.blockNames[blockNum]][p]))
+        return And(conditions)
+
+    def inBlock(self, x, blockNum):
+        return Or([And(self.vars[x][p], self._slotInBlock(p, blockNum)) for p in self.slots])
+
+    def blockStart(self, x):
+        return Or(self.vars[x][1], Or([And(self.vars[x][p], self.separator[p - 1]) for p in self.slots[1:]]))
+
+    def blockEnd(self, x):
+        return Or(self.vars[x][self.n_total], Or([And(self.vars[x][p], self.separator[p + 1]) for p in self.slots[:-1]]))
+
+    #make sure blocks are evenly sized; lengths are counted in half sketches so everything stays integer
+    def blockSizing(self, shortNames):
+        if self.n_total < len(self.blockNames) + len(shortNames):
+            raise ValueError("There must be at least as many positions as block separators plus vignettes and diddies")
+        conditions = []
+
+        #block separators are in correct order, and no empty blocks
+        for i in range(1, len(self.blockNames)):
+            conditions.append(self.before(self.blockNames[i - 1], self.blockNames[i]))
+        if len(self.blockNames) > 0:
+            conditions.append(Not(self.separator[1]))
+            conditions.append(Not(self.separator[self.n_total]))
+        for p in self.slots[:-1]:
+            conditions.append(Not(And(self.separator[p], self.separator[p + 1])))
+
+        #every term is If(condition, weight, 0), so the lengths stay pseudo-boolean sums (and can be bit-blasted for exportModel)
+        block_lengths = []
+        for blockNum in range(len(self.blockNames) + 1):
+            terms = []
+            for p in self.slots:
+                short = Or([self.vars[name][p] for name in shortNames])
+                inBlock = self._slotInBlock(p, blockNum)
+                terms.append(If(And(inBlock, short), 1, 0))
+                terms.append(If(And(inBlock, Not(short)), 2, 0))
+            block_lengths.append(Sum(terms))
+
+        #ensure lengths are within 1 sketch (2 half sketches) of one another
+        for i in range(len(block_lengths)):
+            for j in range(i + 1, len(block_lengths)):
+                conditions.append(block_lengths[i] - block_lengths[j] <= 2)
+                conditions.append(block_lengths[i] - block_lengths[j] >= -2)
+
+        return And(conditions)
+
+    def atMostOnePerBlock(self, names):
+        constraints = []
+        if len(names) < 2:
+            return constraints
+        for blockNum in range(len(self.blockNames) + 1):
+            constraints.append(AtMost(*([self.inBlock(name, blockNum) for name in names] + [1])))
+        return constraints
+
+    #starting values for every position variable, taken from a complete show order
+    def initialValues(self, showOrder):
+        values = []
+        for (position, name) in enumerate(showOrder):
+            for p in self.slots:
+                values.append((self.vars[name][p], p == position + 1))
+                values.append((self.upTo[name][p], p >= position + 1))
+        for p in self.slots:
+            values.append((self.separator[p], showOrder[p - 1] in self.blockNames))
+        return values
+
+    def decode(self, model):
+        if len(model) == 0:
+            return None
+        order = []
+        for p in self.slots:
+            for name in self.vars:
+                if is_true(model.eval(self.vars[name][p])):
+                    order.append(name)
+                    break
+        return order
+
+ENCODINGS = {"int": IntEncoding, "bool": BoolEncoding}
+
+#How the z3 backend is told what to minimize: "soft" adds a weighted soft constraint for every pair of sketches sharing actors
+#(weighted negatively, since being adjacent is what costs) and for every pair of big or small sketches; "minimize" sums the same
+#terms, all with positive weights, into one pseudo-boolean objective for Optimize.minimize
+OBJECTIVES = ["soft", "minimize"]
+
+#MaxSAT strategies z3 can use on either objective: core-guided (maxres, rc2), wmax, or a linear search that keeps demanding an
+#order better than the last one it found ("linear", z3's sortmax engine)
+MAXSAT_STRATEGIES = {"maxres": "maxres", "wmax": "wmax", "rc2": "rc2", "linear": "sortmax"}
+
+#None weighs quick changes and adjacent big/small sketches together the way scoreOrder does; "quickChanges" minimizes quick changes
+#first and only then adjacent big/small sketches, "sizes" the other way around
+PRIORITIES = [None, "quickChanges", "sizes"]
+
+#Files exportModel can write, by file extension: SMT-LIB2 (either encoding, with z3's own soft constraints or objectives), and,
+#with the Boolean encoding only, weighted CNF for MaxSAT solvers or OPB for pseudo-boolean solvers
+EXPORT_FORMATS = {".smt2": "smt2", ".wcnf": "wcnf", ".opb": "opb"}
+
+#Local search backend: simulated annealing over the show order itself, without z3.
+#The show is a list of item numbers with SEP standing in for every block separator. Hard rules are turned into penalties
+#and only orders with no penalties are ever reported, so the best order found so far is always a valid one.
+#Everything that only depends on neighbouring sketches (quick changes, big/small adjacency, triple changes, max changes per actor,
+#nonAdjacentSketches) is scored incrementally from small windows around each move; block level rules are rescored in one pass.
+class LocalSearch:
+    PENALTY = 10 #cost of breaking one hard rule, the same as 10 quick changes
+    ROUND_LENGTH = 20000 #moves per cooling round
+    startTemp, endTemp = 5.0, 0.05
+
+    def __init__(self, show, numBlocks, maxChangesPerActor, firstNames, lastNames, nonAdjacentPairs, differentBlockPairs,
+                 blockStartNames, notInFirstBlockNames, requireNoAdjacentSmalls, requireNoAdjacentBigs):
+        self.names = show.names
+        self.n = len(self.names)
+        self.SEP = self.n
+        self.numBlocks = numBlocks
+        self.maxChangesPerActor = maxChangesPerActor
+        index = show.index
+
+        #cast overlap between every pair of items; the separator (last row/column) shares nobody with anything
+        incidence = numpy.hstack([show.incidence, numpy.zeros((len(show.actorNames), 1), dtype = numpy.int32)])
+        shared = incidence.T @ incidence
+        self.sharedActors = [[[] for b in range(self.n + 1)] for a in range(self.n + 1)]
+        for (a, b) in zip(*numpy.nonzero(shared)):
+            if a != b:
+                self.sharedActors[a][b] = list(numpy.flatnonzero(incidence[:, a] * incidence[:, b]))
+        self.numActors = len(show.actorNames)
+
+        short = numpy.append(show.kinds != show.SKETCH, False)
+        sizes = numpy.append(show.sizes, 3)
+        big = sizes >= 5
+        small = sizes <= 2
+        bigPairs = numpy.outer(big, big)
+        smallPairs = numpy.outer(small, small)
+
+        #soft cost and hard violations of putting two items next to each other
+        pairSoft = shared.copy()
+        pairHard = numpy.outer(short, short).astype(numpy.int32) #vignettes and diddies are never adjacent
+        pairSoft += 2 * numpy.where(requireNoAdjacentBigs, 0, bigPairs) + 2 * numpy.where(requireNoAdjacentSmalls, 0, smallPairs)
+        pairHard += numpy.where(requireNoAdjacentBigs, bigPairs, 0) + numpy.where(requireNoAdjacentSmalls, smallPairs, 0)
+        for (a, b) in nonAdjacentPairs:
+            pairHard[index[a], index[b]] += 1
+            pairHard[index[b], index[a]] += 1
+        pairSoft[self.SEP, :] = 0
+        pairSoft[:, self.SEP] = 0
+        pairHard[self.SEP, :] = 0
+        pairHard[:, self.SEP] = 0
+        numpy.fill_diagonal(pairSoft, 0)
+        numpy.fill_diagonal(pairHard, 0)
+        self.pairSoft = pairSoft.tolist()
+        self.pairHard = pairHard.tolist()
+
+        #three items in a row sharing an actor is a triple change
+        self.tripleHard = set([])
+        for a in range(self.n):
+            for b in range(self.n):
+                if a != b and len(self.sharedActors[a][b]) > 0:
+                    common = incidence[:, a] * incidence[:, b]
+                    for c in numpy.flatnonzero(common @ incidence):
+                        if c != a and c != b:
+                            self.tripleHard.add((a, b, c))
+
+        #block level data
+        self.weight = [1 if isShort else 2 for isShort in short[:self.n]] + [0] #half sketches, so block balance stays integer
+        self.isShort = [bool(isShort) for isShort in short[:self.n]] + [False]
+        self.isVignette = [bool(kind == show.VIGNETTE) for kind in show.kinds] + [False]
+        self.isDiddy = [bool(kind == show.DIDDY) for kind in show.kinds] + [False]
+        self.vignetteSets = show.vignetteSets
+        self.firsts = set(index[name] for name in firstNames) if not (firstNames is None) else None
+        self.lasts = set(index[name] for name in lastNames) if not (lastNames is None) else None
+        self.differentBlockPairs = [(index[a], index[b]) for (a, b) in differentBlockPairs]
+        self.blockStarts = [index[name] for name in blockStartNames]
+        self.notInFirstBlock = [index[name] for name in notInFirstBlockNames] if numBlocks > 1 else []
+
+    #cost of every pair and triple that lies completely inside a window of items:
+    #(soft cost, hard violations, actors with a quick change for each pair in the window)
+    def _window(self, window):
+        soft = 0
+        hard = 0
+        changes = []
+        for k in range(len(window) - 1):
+            a, b = window[k], window[k + 1]
+            soft += self.pairSoft[a][b]
+            hard += self.pairHard[a][b]
+            changes.extend(self.sharedActors[a][b])
+            if k + 2 < len(window) and (a, b, window[k + 2]) in self.tripleHard:
+                hard += 1
+        return soft, hard, changes
+
+    #block level hard rules, scored with one pass over the order
+    def _global(self, seq):
+        hard = 0
+        if seq[0] == self.SEP or seq[-1] == self.SEP:
+            hard += 1
+        if self.isShort[seq[0]] or self.isShort[seq[-1]]:
+            hard += 1
+        if not (self.firsts is None) and not (seq[0] in self.firsts):
+            hard += 1
+        if not (self.lasts is None) and not (seq[-1] in self.lasts):
+            hard += 1
+
+        position = [0] * (self.n + 1)
+        blockOf = [0] * (self.n + 1)
+        lengths = [0] * self.numBlocks
+        vignettes = [0] * self.numBlocks
+        diddies = [0] * self.numBlocks
+        block = 0
+        for (p, item) in enumerate(seq):
+            if item == self.SEP:
+                block += 1
+                if p > 0 and seq[p - 1] == self.SEP:
+                    hard += 1 #empty block
+                continue
+            position[item] = p
+            blockOf[item] = block
+            lengths[block] += self.weight[item]
+            vignettes[block] += self.isVignette[item]
+            diddies[block] += self.isDiddy[item]
+
+        hard += max(0, (max(lengths) - min(lengths) + 1) // 2 - 1)
+        hard += sum(max(0, count - 1) for count in vignettes) + sum(max(0, count - 1) for count in diddies)
+        for vignetteSet in self.vignetteSets:
+            for k in range(1, len(vignetteSet)):
+                if position[vignetteSet[k - 1]] > position[vignetteSet[k]]:
+                    hard += 1
+        for (a, b) in self.differentBlockPairs:
+            if blockOf[a] == blockOf[b]:
+                hard += 1
+        for item in self.blockStarts:
+            if position[item] > 0 and seq[position[item] - 1] != self.SEP:
+                hard += 1
+        for item in self.notInFirstBlock:
+            if blockOf[item] == 0:
+                hard += 1
+        return hard
 
-    def add(self, key, value):
-        if key in self.map.keys():
-            lst = self.map[key]
-            lst.append(value)
-            self.map[key] = lst
+    def _capPenalty(self, changes):
+        return sum(max(0, count - self.maxChangesPerActor) for count in changes)
+
+    #full score of an order: (soft cost, hard violations, quick changes per actor)
+    def evaluate(self, seq):
+        soft, hard, changed = self._window(seq)
+        changes = [0] * self.numActors
+        for actor in changed:
+            changes[actor] += 1
+        return soft, hard + self._capPenalty(changes) + self._global(seq), changes
+
+    #windows of the old and new order that contain every pair and triple a move can change
+    def _windows(self, seq, new, positions):
+        positions = sorted(positions)
+        groups = [[positions[0], positions[0]]]
+        for p in positions[1:]:
+            if p - groups[-1][1] <= 4:
+                groups[-1][1] = p
+            else:
+                groups.append([p, p])
+        oldWindows = []
+        newWindows = []
+        for (lo, hi) in groups:
+            lo, hi = max(0, lo - 2), hi + 3
+            oldWindows.append(seq[lo:hi])
+            newWindows.append(new[lo:hi])
+        return oldWindows, newWindows
+
+    def _randomMove(self, seq, rng):
+        length = len(seq)
+        roll = rng.random()
+        new = list(seq)
+        if roll < 0.4:
+            #swap two items
+            i, j = rng.randrange(length), rng.randrange(length)
+            new[i], new[j] = new[j], new[i]
+            return new, [i, j]
+        if roll < 0.8:
+            #take one item out and put it back in somewhere else
+            i, j = rng.randrange(length), rng.randrange(length)
+            item = new.pop(i)
+            new.insert(j, item)
+            if abs(i - j) > 4:
+                #everything between i and j just shifts over by one, so only the two ends of the move change pairs and triples
+                oldWindows = [seq[max(0, i - 2):i + 3]]
+                newWindows = [seq[max(0, i - 2):i] + seq[i + 1:i + 3]]
+                if i < j:
+                    #item lands between seq[j] and seq[j + 1]
+                    oldWindows.append(seq[j - 1:j + 3])
+                    newWindows.append(seq[j - 1:j + 1] + [item] + seq[j + 1:j + 3])
+                else:
+                    #item lands between seq[j - 1] and seq[j]
+                    oldWindows.append(seq[max(0, j - 2):j + 2])
+                    newWindows.append(seq[max(0, j - 2):j] + [item] + seq[j:j + 2])
+                return new, (oldWindows, newWindows)
+            return new, list(range(min(i, j), max(i, j) + 1))
+        #move a block boundary by one or two spots
+        separators = [p for (p, item) in enumerate(seq) if item == self.SEP]
+        if len(separators) == 0:
+            return self._randomMove(seq, rng)
+        i = rng.choice(separators)
+        j = min(length - 1, max(0, i + rng.choice([-2, -1, 1, 2])))
+        item = new.pop(i)
+        new.insert(j, item)
+        return new, list(range(min(i, j), max(i, j) + 1))
+
+    def _delta(self, seq, new, changed, changes):
+        if isinstance(changed, tuple):
+            oldWindows, newWindows = changed
         else:
-            self.map[key] = [value]
+            oldWindows, newWindows = self._windows(seq, new, changed)
+        softDelta = 0
+        hardDelta = 0
+        touched = {}
+        for window in oldWindows:
+            soft, hard, changedActors = self._window(window)
+            softDelta -= soft
+            hardDelta -= hard
+            for actor in changedActors:
+                touched[actor] = touched.get(actor, 0) - 1
+        for window in newWindows:
+            soft, hard, changedActors = self._window(window)
+            softDelta += soft
+            hardDelta += hard
+            for actor in changedActors:
+                touched[actor] = touched.get(actor, 0) + 1
+        limit = self.maxChangesPerActor
+        for (actor, diff) in touched.items():
+            if diff != 0:
+                before = changes[actor]
+                hardDelta += max(0, before + diff - limit) - max(0, before - limit)
+        return softDelta, hardDelta, touched
+
+    #order that keeps cast overlap low: start from an allowed first sketch and keep appending whichever remaining item shares the
+    #fewest actors with the last one, skipping vignettes that would come out of order and vignettes/diddies next to each other
+    def greedyOrder(self, rng):
+        remaining = list(range(self.n))
+        rng.shuffle(remaining)
+        firsts = [item for item in remaining if not self.isShort[item] and (self.firsts is None or item in self.firsts)]
+        items = [firsts[0] if len(firsts) > 0 else remaining[0]]
+        remaining.remove(items[0])
+        laterVignettes = set([])
+        for vignetteSet in self.vignetteSets:
+            laterVignettes.update(vignetteSet[1:])
+        laterVignettes.discard(items[0])
+        while len(remaining) > 0:
+            def cost(item):
+                return (item in laterVignettes, self.pairHard[items[-1]][item] + self.pairSoft[items[-1]][item])
+            item = min(remaining, key = cost)
+            items.append(item)
+            remaining.remove(item)
+            for vignetteSet in self.vignetteSets:
+                if item in vignetteSet and vignetteSet.index(item) + 1 < len(vignetteSet):
+                    laterVignettes.discard(vignetteSet[vignetteSet.index(item) + 1])
+        return self.initialOrder(rng, items)
+
+    #turn a show order given as names (with any name starting with "Block" marking a block separator) into the item
+    #numbers used by the search; if there are no separators in it they are spread evenly
+    def encode(self, showOrder):
+        index = {name: i for (i, name) in enumerate(self.names)}
+        seq = []
+        for name in showOrder:
+            if not isinstance(name, str):
+                raise TypeError("A seed order must be a list of sketch names (or \"greedy\")")
+            if name[:5] == "Block" and not (name in index):
+                seq.append(self.SEP)
+            elif name in index:
+                seq.append(index[name])
+            else:
+                raise ValueError(name + " in the seed order is not one of the sketches being ordered")
+        items = [item for item in seq if item != self.SEP]
+        if sorted(items) != list(range(self.n)):
+            raise ValueError("A seed order must contain every sketch (and every vignette in a set) exactly once")
+        if len(items) == len(seq):
+            return self.initialOrder(None, items)
+        if len(seq) - len(items) != self.numBlocks - 1:
+            raise ValueError("A seed order must mark either no block separators or exactly numBlocks - 1 of them")
+        return seq
+
+    #starting order: items in the given order (or shuffled) with block separators spread evenly between them
+    def initialOrder(self, rng, items = None):
+        if items is None:
+            items = list(range(self.n))
+            rng.shuffle(items)
+        seq = []
+        for (k, item) in enumerate(items):
+            if k > 0 and (k * self.numBlocks) // len(items) != ((k - 1) * self.numBlocks) // len(items):
+                seq.append(self.SEP)
+            seq.append(item)
+        return seq
+
+    def decode(self, seq):
+        showOrder = []
+        blockNum = 1
+        for item in seq:
+            if item == self.SEP:
+                showOrder.append("Block " + str(blockNum))
+                blockNum += 1
+            else:
+                showOrder.append(self.names[item])
+        return showOrder
+
+    #anneal until timeout (in seconds) and return the best valid order found, or None if nothing valid turned up
+    #onImprove(showOrder, objective) is called every time a better valid order is found
+    #startOrder is an optional show order (as names) to begin from; if it is valid it is also the first best order
+    def search(self, timeout, onImprove = None, seed = None, startOrder = None, target = 0):
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        best = None
+        bestSoft = None
+        iteration = self.ROUND_LENGTH
+        if not (startOrder is None):
+            seq = self.encode(startOrder)
+            soft, hard, changes = self.evaluate(seq)
+            hardGlobal = self._global(seq)
+            iteration = 0
+            if hard == 0:
+                best = list(seq)
+                bestSoft = soft
+        while True:
+            if iteration % 200 == 0:
+                if time.perf_counter() - start >= timeout or (not (bestSoft is None) and bestSoft <= target):
+                    break
+            if iteration >= self.ROUND_LENGTH:
+                #start a new cooling round, from the best valid order if there is one and from a fresh shuffle otherwise
+                seq = list(best) if not (best is None) and rng.random() < 0.5 else self.initialOrder(rng)
+                soft, hard, changes = self.evaluate(seq)
+                hardGlobal = self._global(seq)
+                iteration = 0
+            temp = self.startTemp * (self.endTemp / self.startTemp) ** (iteration / self.ROUND_LENGTH)
+            iteration += 1
+
+            new, changed = self._randomMove(seq, rng)
+            softDelta, hardDelta, touched = self._delta(seq, new, changed, changes)
+            newGlobal = self._global(new)
+            hardDelta += newGlobal - hardGlobal
+            costDelta = softDelta + self.PENALTY * hardDelta
+            if costDelta <= 0 or rng.random() < math.exp(-costDelta / temp):
+                seq = new
+                soft += softDelta
+                hard += hardDelta
+                hardGlobal = newGlobal
+                for (actor, diff) in touched.items():
+                    changes[actor] += diff
+                if hard == 0 and (bestSoft is None or soft < bestSoft):
+                    best = list(seq)
+                    bestSoft = soft
+                    if not (onImprove is None):
+                        onImprove(self.decode(best), bestSoft)
+
+        if best is None:
+            return None
+        return self.decode(best)
+
+BACKENDS = ["z3", "local", "decompose"]
+
+#Phase two of ShowOrderer.decomposeShow: order the sketches of a single block, in its own process
+#Blocks are separated by a block separator, so no two blocks ever share an adjacent pair; what still ties a block to the rest of
+#the show is whether it opens or closes the show (isFirstBlock/isLastBlock) and how many quick changes each actor may spend in it (caps)
+def _orderBlock(names, itemActors, kinds, isFirstBlock, isLastBlock, firsts, lasts, blockStarts, nonAdjacentPairs, caps,
+                requireNoAdjacentSmalls, requireNoAdjacentBigs, timeout, seedOrder = None):
+    s = Optimize()
+    s.set("timeout", timeout)
+    enc = BoolEncoding(names, [])
+    s.add(enc.positions())
+
+    shared = {}
+    for (i, x) in enumerate(names):
+        for (j, y) in enumerate(names[i + 1:], i + 1):
+            common = set(itemActors[x]) & set(itemActors[y])
+            if len(common) > 0:
+                shared[(x, y)] = common
+                s.add_soft(Not(enc.adjacent(x, y)), weight = len(common))
+                for z in names[j + 1:]:
+                    if len(common & set(itemActors[z])) > 0:
+                        s.add(Not(enc.tripleChange(x, y, z)))
+            if kinds[x] != "sketch" and kinds[y] != "sketch":
+                s.add(Not(enc.adjacent(x, y)))
+            for (isSize, required) in [(lambda n: n >= 5, requireNoAdjacentBigs), (lambda n: n <= 2, requireNoAdjacentSmalls)]:
+                if isSize(len(itemActors[x])) and isSize(len(itemActors[y])):
+                    if required:
+                        s.add(Not(enc.adjacent(x, y)))
+                    else:
+                        s.add_soft(Not(enc.adjacent(x, y)), weight = 2)
+
+    for (actor, cap) in caps.items():
+        changes = [If(enc.adjacent(x, y), 1, 0) for ((x, y), common) in shared.items() if actor in common]
+        if len(changes) > cap:
+            s.add(Sum(changes) <= cap)
+
+    for x in names:
+        if kinds[x] != "sketch" and isFirstBlock:
+            s.add(Not(enc.first(x)))
+        if kinds[x] != "sketch" and isLastBlock:
+            s.add(Not(enc.last(x)))
+    if isFirstBlock and not (firsts is None):
+        s.add(Or([enc.first(x) for x in firsts if x in names]))
+    if isLastBlock and not (lasts is None):
+        s.add(Or([enc.last(x) for x in lasts if x in names]))
+    for x in blockStarts:
+        s.add(enc.first(x))
+    for (x, y) in nonAdjacentPairs:
+        s.add(Not(enc.adjacent(x, y)))
+    if not (seedOrder is None):
+        for (var, value) in enc.initialValues(seedOrder):
+            s.set_initial_value(var, value)
+
+    result = s.check()
+    if result == unsat:
+        return None
+    try:
+        return enc.decode(s.model())
+    except Z3Exception:
+        return [] #ran out of time before finding any order; unlike None, this doesn't rule the block out
+
+#What orderShow did, section by section: sections maps each part of the model ("positions", "block sizing", "quick changes",
+#"vignettes and diddies", "big and small sketches", "objective", "user constraints") to the seconds spent encoding it and the
+#number of hard and soft constraints it added; statistics holds z3's own statistics after the search; improvements lists (seconds since orderShow
+#was called, score) for every better order the solver found along the way; status is "optimal", "within X of bound" (the order
+#scores X more than ShowOrderer.lowerBound, so it is at most X away from the best possible order) or "timeout" (no order found)
+class SolveReport:
+    def __init__(self):
+        self.sections = {}
+        self.statistics = {}
+        self.improvements = []
+        self.status = None
+        self.order = None
+        self.objective = None
+        self.lowerBound = None
+        self.gap = None
+        self.encodeTime = None
+        self.searchTime = None
+        self._current = None
+        self._sectionStart = None
+
+    #start timing a new section (and stop timing the one before it); None just stops the current one
+    def section(self, name):
+        if not (self._current is None):
+            self.sections[self._current]["time"] += time.perf_counter() - self._sectionStart
+        self._current = name
+        self._sectionStart = time.perf_counter()
+        if not (name is None) and not (name in self.sections):
+            self.sections[name] = {"time": 0.0, "hard": 0, "soft": 0}
+
+    #wrap a solver so every constraint added through it is counted toward the current section
+    def record(self, s):
+        return _RecordingSolver(s, self)
+
+    def _count(self, kind, number):
+        if not (self._current is None):
+            self.sections[self._current][kind] += number
+
+class _RecordingSolver:
+    def __init__(self, s, report):
+        self.s = s
+        self.report = report
+
+    def add(self, *constraints):
+        self.report._count("hard", sum(self._conjuncts(c) for c in constraints))
+        self.s.add(*constraints)
+
+    #a list or an And (like the one blockSizing returns) counts as every constraint in it
+    def _conjuncts(self, constraint):
+        if isinstance(constraint, (list, tuple)):
+            return sum(self._conjuncts(c) for c in constraint)
+        if is_and(constraint):
+            return sum(self._conjuncts(c) for c in constraint.children())
+        return 1
+
+    def add_soft(self, *args, **kwargs):
+        self.report._count("soft", 1)
+        return self.s.add_soft(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.s, name)
+
+#Lets _encodeShow fill a plain z3 Solver: soft constraints don't matter when all we ask is whether any order exists
+class _HardOnly:
+    def __init__(self, s):
+        self.s = s
+
+    def add(self, *constraints):
+        self.s.add(*constraints)
+
+    def add_soft(self, *args, **kwargs):
+        pass
+
+#Lets _encodeShow fill plain lists, so exportModel can write the model out itself. Soft constraints are kept as
+#(constraint, weight, id) with a positive weight: a negative weight on a constraint is the same as that weight on its negation
+#(and not every solver reading an export accepts negative weights)
+class _Collector:
+    def __init__(self):
+        self.hard = []
+        self.soft = []
+        self.objectives = []
+
+    def add(self, *constraints):
+        for constraint in constraints:
+            if isinstance(constraint, (list, tuple)):
+                self.hard.extend(constraint)
+            else:
+                self.hard.append(constraint)
+
+    def add_soft(self, constraint, weight = 1, id = None):
+        if weight < 0:
+            constraint, weight = Not(constraint), -weight
+        self.soft.append((constraint, weight, id))
+
+    def minimize(self, objective):
+        self.objectives.append(objective)
+
+#Tseitin encoding of bit-blasted z3 formulas (and, or, not, ite, =, xor, implies over Boolean variables) into numbered clauses,
+#for the WCNF and OPB exports. Every subformula gets one variable no matter how often it is shared, so the clauses grow linearly
+#with the formulas. Variables are numbered in the order they are first asked for, and names[v - 1] is the name of variable v
+#(None for the ones made up here)
+class _Cnf:
+    def __init__(self):
+        self.names = []
+        self.clauses = []
+        self._literals = {} #z3 AST id -> literal standing for that formula
+
+    def variable(self, atom, name = None):
+        key = atom.get_id()
+        if not (key in self._literals):
+            self.names.append(name)
+            self._literals[key] = len(self.names)
+        return self._literals[key]
+
+    def _fresh(self):
+        self.names.append(None)
+        return len(self.names)
 
-    def get(self, key):
-        if not(key in self.map.keys()):
-            return []
-        return self.map[key]
+    def literal(self, formula):
+        #depth first, looking at every formula's kind and children only once (each look is a call into z3)
+        stack = [(formula, None, None)]
+        while len(stack) > 0:
+            f, kind, children = stack[-1]
+            if f.get_id() in self._literals:
+                stack.pop()
+                continue
+            if kind is None:
+                kind = f.decl().kind()
+                if kind in [Z3_OP_TRUE, Z3_OP_FALSE]:
+                    v = self._fresh()
+                    self.clauses.append([v] if kind == Z3_OP_TRUE else [-v])
+                    self._literals[f.get_id()] = v
+                    stack.pop()
+                    continue
+                if kind == Z3_OP_UNINTERPRETED:
+                    self.variable(f, f.decl().name())
+                    stack.pop()
+                    continue
+                children = f.children()
+                stack[-1] = (f, kind, children)
+                stack.extend((child, None, None) for child in children if not (child.get_id() in self._literals))
+                continue
+            stack.pop()
+            args = [self._literals[child.get_id()] for child in children]
+            if kind == Z3_OP_NOT:
+                self._literals[f.get_id()] = -args[0]
+                continue
+            v = self._fresh()
+            if kind == Z3_OP_AND:
+                self.clauses.extend([[-v, a] for a in args])
+                self.clauses.append([v] + [-a for a in args])
+            elif kind in [Z3_OP_OR, Z3_OP_IMPLIES]:
+                if kind == Z3_OP_IMPLIES:
+                    args = [-args[0], args[1]]
+                self.clauses.extend([[v, -a] for a in args])
+                self.clauses.append([-v] + args)
+            elif kind == Z3_OP_ITE:
+                c, t, e = args
+                self.clauses.extend([[-v, -c, t], [-v, c, e], [v, -c, -t], [v, c, -e]])
+            elif kind in [Z3_OP_EQ, Z3_OP_IFF, Z3_OP_XOR, Z3_OP_DISTINCT] and len(args) == 2:
+                a, b = args if kind in [Z3_OP_EQ, Z3_OP_IFF] else (args[0], -args[1])
+                self.clauses.extend([[-v, -a, b], [-v, a, -b], [v, a, b], [v, -a, -b]])
+            else:
+                raise ValueError("Can't write " + str(f.decl()) + " as clauses")
+            self._literals[f.get_id()] = v
+        return self._literals[formula.get_id()]
 
-    def keys(self):
-        return self.map.keys()
+    #make a formula hold: conjunctions become several clauses and disjunctions one clause, without new variables
+    def add(self, formula):
+        if is_and(formula):
+            for child in formula.children():
+                self.add(child)
+        elif is_or(formula):
+            self.clauses.append([self.literal(child) for child in formula.children()])
+        elif not is_true(formula):
+            self.clauses.append([self.literal(formula)])
 
 class ShowOrderer:
     def __init__(self, sketches):
@@ -87,232 +1028,353 @@ class ShowOrderer:
 
         self.sketches = numpy.random.permutation(sketches) #shuffle to get new starting point on different runs
         self.order = None
+        self.status = None
+        self.encoding = None
+        self._actorChanges = None #quick change terms of every actor and adjacent big/small pairs in self.encoding, for _userConstraints
+        self._sizePairs = None
+        self.encodeTime = None #seconds spent building the model before the last search started
+        self.report = None #SolveReport of the last orderShow
+        self.show = CompiledShow(self.sketches)
 
-    #helper to make sure blocks are evenly sized
-    def _blockSizing(self, blocks, vignettes_and_diddies, n_total):
-        if not (isinstance(n_total, int)):
-            raise TypeError("Last argument must be an integer representing number of sketches (each vignette counted as separate sketch) plus desired number of stage blocks minus 1")
-        if n_total < len(blocks) + len(vignettes_and_diddies):
-            raise ValueError("Last argument must be an integer representing number of sketches (each vignette counted as separate sketch) plus desired number of stage blocks minus 1")
-        if not(isinstance(blocks, list)):
-            raise TypeError("First argument must be list of z3 int variables corresponding to positions between stage blocks")
-        for block in blocks:
-            if not(isinstance(block, z3.z3.ArithRef) and block.is_int()):
-                raise TypeError("Every element of first argument must be a z3 int variable")
-        if not(isinstance(vignettes_and_diddies, list)):
-            raise TypeError("Second argument must be list of z3 int variables corresponding to positions of vignettes and diddies")
-        for sketch in vignettes_and_diddies:
-            if not (isinstance(sketch, z3.z3.ArithRef) and sketch.is_int()):
-                raise TypeError("Every element of second argument must be a z3 int variable")
-    
-        blocks.insert(0, 0) 
-        blocks.append(n_total + 1) #adjust list of block positions so length of any stage block will be the difference between 2 list elems
-    
-        #compute length of each block
-        block_lengths = []
-        for block_num in range(1, len(blocks)):
-            start_pos = blocks[block_num - 1]
-            end_pos = blocks[block_num]
-            length = end_pos - start_pos - 1
-            for short_sketch in vignettes_and_diddies:
-                length = length - 0.5*And(short_sketch > start_pos, short_sketch < end_pos) #vignettes/diddies count as half a sketch for length purposes
-            block_lengths.append(length)
-    
-        #ensure lengths are within 1 of 1 another
-        length_conditions = []
-        for i in range(len(block_lengths)):
-            for j in range(i + 1, len(block_lengths)):
-                length_conditions.append(block_lengths[i] - block_lengths[j] <= 1)
-                length_conditions.append(block_lengths[i] - block_lengths[j] >= -1)
+    #number of quick changes in an order: every actor shared by two adjacent sketches
+    def quickChanges(self, showOrder):
+        ids = numpy.array([self.show.index.get(name, -1) for name in showOrder], dtype = numpy.int64)
+        together = (ids[:-1] >= 0) & (ids[1:] >= 0) #no block separator between them
+        return int(self.show.shared[ids[:-1][together], ids[1:][together]].sum())
 
-        #no empty blocks, and block variables are in correct order
-        for block_num in range(1, len(blocks)):
-            length_conditions.append(blocks[block_num] - blocks[block_num - 1] > 1)
-    
-        return And(length_conditions)
+    #score an order the way the optimizer sees it: every actor shared by two adjacent sketches is a quick change,
+    #and every adjacent pair of big (>= 5 actors) or small (<= 2 actors) sketches counts as 2 quick changes
+    def scoreOrder(self, showOrder):
+        quickChanges, sizes = self.scoreParts(showOrder)
+        return quickChanges + sizes
 
-    def _adjacent(self, x, y):
-        if not (isinstance(x, z3.z3.ArithRef) and isinstance(y, z3.z3.ArithRef) and x.is_int() and y.is_int()):
-            raise TypeError("Both inputs must be z3 integer variables")
-    
-        return Or(x - y == 1, x - y == -1)
+    #the two parts of scoreOrder: (quick changes, 2 for every adjacent pair of big or small sketches)
+    def scoreParts(self, showOrder):
+        ids = numpy.array([self.show.index.get(name, -1) for name in showOrder], dtype = numpy.int64)
+        together = (ids[:-1] >= 0) & (ids[1:] >= 0) #no block separator between them
+        prev, curr = ids[:-1][together], ids[1:][together]
+        quickChanges = self.show.shared[prev, curr].sum()
+        big = self.show.sizes >= 5
+        small = self.show.sizes <= 2
+        sizeAdjacencies = ((big[prev] & big[curr]) | (small[prev] & small[curr])).sum()
+        return (int(quickChanges), int(2 * sizeAdjacencies))
 
-    def _tripleChange(self, x, y, z):
-        if not (isinstance(x, z3.z3.ArithRef) and isinstance(y, z3.z3.ArithRef) and isinstance(z, z3.z3.ArithRef) 
-                and x.is_int() and y.is_int() and z.is_int()):
-            raise TypeError("All inputs must be z3 integer variables")
+    #what the optimizer compares orders by with the given priority: scoreOrder for None, otherwise a tuple, most important part first
+    def _objectiveKey(self, showOrder, priority = None):
+        quickChanges, sizes = self.scoreParts(showOrder)
+        if priority == "quickChanges":
+            return (quickChanges, sizes)
+        if priority == "sizes":
+            return (sizes, quickChanges)
+        return quickChanges + sizes
 
-        return Or(And(self._adjacent(x, y), self._adjacent(y, z)), And(self._adjacent(y, x), self._adjacent(x, z)), And(self._adjacent(y, z), self._adjacent(z, x)))
+    #Quick checks for requests that can never all hold, so a contradiction is reported in milliseconds instead of after a whole
+    #search. Returns a list of problems (empty if none of these checks fail; the requests may still conflict in subtler ways)
+    def presolve(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                 differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+        problems = []
+        show = self.show
+        n = len(show.names)
+        spread = (n + numBlocks) // 2 #most items that can be kept apart from one another (see lowerBound)
 
-    def orderShow(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, 
-                  differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, timeout):
-        #most input checking is done by driver function intended to call this one, but we'll take care of this real quick:
-        if numBlocks > len(self.sketches):
-            raise ValueError("Too many blocks, not enough sketches!")
+        #at most one vignette (from any set) and one diddy per block, never next to each other
+        diddies = [sketch for sketch in self.sketches if isinstance(sketch, Diddy)]
+        vignettes = sum(len(sketch.actors) for sketch in self.sketches if isinstance(sketch, Vignettes))
+        if vignettes > numBlocks:
+            problems.append("There are " + str(vignettes) + " vignettes but only " + str(numBlocks) +
+                            " blocks (at most one vignette per block)")
+        if len(diddies) > numBlocks:
+            problems.append("There are " + str(len(diddies)) + " diddies but only " + str(numBlocks) + " blocks (at most one diddy per block)")
+        shorts = sum(len(sketchItems(sketch)) for sketch in self.sketches if isinstance(sketch, (Vignettes, Diddy)))
+        if shorts > spread:
+            problems.append("There are too many vignettes and diddies (" + str(shorts) + ") to keep them all apart")
 
-        print("Encoding constraints...")
-        s = Optimize() 
+        #the first sketch is always in the first block
+        firsts = set(sketch.name for sketch in (desiredFirstSketches or []))
+        lasts = set(sketch.name for sketch in (desiredLastSketches or []))
+        notFirst = set(sketch.name for sketch in (notInFirstBlock or []))
+        if len(firsts) > 0 and numBlocks > 1 and firsts <= notFirst:
+            problems.append("Every sketch in desiredFirstSketches (" + ", ".join(sorted(firsts)) + ") is also in notInFirstBlock")
+        if len(firsts) == 1 and firsts == lasts and n > 1:
+            problems.append(list(firsts)[0] + " is both the only desired first and the only desired last sketch")
+
+        #every block starts with exactly one sketch
+        starts = [sketch.name for sketch in (blockStartingSketches or [])]
+        if len(starts) > numBlocks:
+            problems.append("There are " + str(len(starts)) + " blockStartingSketches but only " + str(numBlocks) + " blocks")
+        elif numBlocks > 1 and len([name for name in starts if name in notFirst]) > numBlocks - 1:
+            problems.append("There are more blockStartingSketches in notInFirstBlock than blocks after the first one")
+        if len(starts) == numBlocks and len(firsts) > 0 and len(firsts & set(starts)) == 0:
+            problems.append("Every block already starts with one of the blockStartingSketches, so none of desiredFirstSketches can open the show")
+
+        for (s1, s2) in (differentBlockSketches or []):
+            if s1.name == s2.name:
+                problems.append(s1.name + " can't be in a different block from itself")
+            elif numBlocks == 1:
+                problems.append("differentBlockSketches asks for " + s1.name + " and " + s2.name + " to be in different blocks, but there is only 1 block")
+
+        #an actor in m items is forced into at least m - spread quick changes, and with no triple changes, every third item of a block
+        #must be one they're not in
+        noTriples = n - max(0, -(-(n - 2 * numBlocks) // 3))
+        counts = dict(zip(show.actorNames, show.incidence.sum(axis = 1).tolist()))
+        for (actor, count) in sorted(counts.items()):
+            if count > noTriples:
+                problems.append(actor + " is in " + str(count) + " sketches, too many to avoid being in three in a row")
+            elif count - spread > maxChangesPerActor:
+                problems.append(actor + " is in " + str(count) + " sketches, which forces at least " + str(count - spread) +
+                                " quick changes (maxChangesPerActor is " + str(maxChangesPerActor) + ")")
+
+        for (group, required, name) in [(int((show.sizes >= 5).sum()), requireNoAdjacentBigs, "big"),
+                                        (int((show.sizes <= 2).sum()), requireNoAdjacentSmalls, "small")]:
+            if required and group > spread:
+                problems.append("There are too many " + name + " sketches (" + str(group) + ") to keep them all apart")
+        return problems
+
+    #Find a smallest set of the director's requests that can't all hold at once, as a list of their labels (see _userConstraints)
+    #An empty list means the show can't be ordered even without any requests; None means z3 couldn't tell within timeout ms
+    def explainConflict(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                        differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                        timeout, encoding = "bool"):
+        s = Solver()
         s.set("timeout", timeout)
-        #Ok, a couple notes on this "s" object:
-        #This is an optimizer from the z3 library
-        #We'll add a bunch of hard and soft constraints, and it will look for the best show order based on those constraints
-        #This happens by adding an int variable corresponding to each sketch. It will assign each variable an integer based on constraints
-            #we give it. Those integers correspond to a sketch's order in the show
-        #(Makes sure to satisfy all of the hards and as many softs as possible, based on weighting of soft constraints)
-        #"Timeout" parameter makes sure it stops after certain time with best order it has found so far
-        #Otherwise it will search for a really long time looking for the best possible order
-        #More info: https://ericpony.github.io/z3py-tutorial/
-        
-        #This section loops through all sketches and does a few things:
-        #Create z3 integer variables for each sketch (or each vignette within a set)
-        #Create map from an actor to all of their sketches so we can manage stuff like quick changes
-        #Keep track of vignettes and diddies, big and small sketches for later requirements
-
-        sketchVars = []
-        blockVars = []
-        actorsToSketches = HashBag()
-        vignetteVars = []
-        diddyVars = []
-        largeSketches = []
-        smallSketches = []
-        
-        for sketch in self.sketches:
-            if isinstance(sketch, Vignettes):
-                for (i, vignette_actors) in enumerate(sketch.actors):
-                    name = sketch.name + " " + str(i + 1)
-                    var = Int(name)
-                    for actor in vignette_actors:
-                        actorsToSketches.add(actor, var)
-                    sketchVars.append(var)
-                    vignetteVars.append(var)
-                    if i > 0:
-                        s.add(sketchVars[-1] > sketchVars[-2]) #make sure vignettes end up in proper order
-
-                    #keep track of large, small sketches
-                    if len(vignette_actors) <= 2:
-                        smallSketches.append(var)
-                    elif len(vignette_actors) >= 5:
-                        largeSketches.append(var)
+        #_encodeShow keeps the encoding it builds on the orderer; put back whatever was there, since a ShowSession (or anything
+        #else still holding that encoding) keeps building requests on it
+        saved = (self.encoding, self._actorChanges, self._sizePairs)
+        try:
+            enc = self._encodeShow(_HardOnly(s), numBlocks, encoding)
+            switches = {}
+            for (label, constraints) in self._userConstraints(enc, numBlocks, maxChangesPerActor, desiredFirstSketches,
+                                                              desiredLastSketches, nonAdjacentSketches, differentBlockSketches,
+                                                              blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                                              notInFirstBlock):
+                switches[label] = Bool(label)
+                s.add(Implies(switches[label], And(constraints)))
+        finally:
+            self.encoding, self._actorChanges, self._sizePairs = saved
+        if s.check(list(switches.values())) != unsat:
+            return None
+
+        #z3's core is small but not always minimal: drop requests one at a time while the rest still conflict
+        core = [label for label in switches if switches[label] in set(s.unsat_core())]
+        for label in list(core):
+            rest = [other for other in core if other != label]
+            if s.check([switches[other] for other in rest]) == unsat:
+                core = [other for other in rest if switches[other] in set(s.unsat_core())]
+        return core
+
+    #The exception to raise when no order can meet every requirement, naming the requests that conflict when possible
+    def _conflict(self, problems = None, core = None):
+        message = "There are no show orders that satisfy all hard constraints."
+        if problems:
+            message += " " + " ".join(problem + "." for problem in problems)
+        elif core is None:
+            message += " Try loosening hard constraints."
+        elif len(core) == 0:
+            message += " Even without any requests, this show can't be split into blocks that follow the basic rules."
+        else:
+            message += " These requests conflict (dropping any one of them fixes it): " + "; ".join(core) + "."
+        return Exception(message)
+
+    #Cheap lower bound on the score of any valid order, from the casts alone. Two bounds, whichever is higher:
+    #- pigeonhole: n items in numBlocks blocks leave room for at most (n + numBlocks) // 2 items that are never next to each other,
+    #  so an actor (or the big or small sketches, at 2 each) in more items than that is forced into that many extra adjacencies
+    #- neighbours: every item except the 2 * numBlocks block ends sits between two neighbours, at best its two cheapest ones,
+    #  and every adjacency is counted from both sides
+    def lowerBound(self, numBlocks, nonAdjacentSketches = None, requireNoAdjacentSmalls = False, requireNoAdjacentBigs = False):
+        show = self.show
+        n = len(show.names)
+        incidence, shared = show.incidence, show.shared
+        big = show.sizes >= 5
+        small = show.sizes <= 2
+        short = show.kinds != show.SKETCH
+
+        spread = (n + numBlocks) // 2
+        pigeonhole = int(numpy.maximum(incidence.sum(axis = 1) - spread, 0).sum())
+        for (group, required) in [(big, requireNoAdjacentBigs), (small, requireNoAdjacentSmalls)]:
+            if not required:
+                pigeonhole += 2 * max(0, int(group.sum()) - spread)
+
+        cost = shared.astype(float)
+        banned = numpy.eye(n, dtype = bool) | numpy.outer(short, short) #vignettes and diddies are never adjacent
+        for (group, required) in [(big, requireNoAdjacentBigs), (small, requireNoAdjacentSmalls)]:
+            if required:
+                banned |= numpy.outer(group, group)
             else:
-                var = Int(sketch.name)
-                for actor in sketch.actors:
-                    actorsToSketches.add(actor, var)
-                sketchVars.append(var)
-                if isinstance(sketch, Diddy):
-                    diddyVars.append(var)
-
-                #keep track of large, small sketches
-                    if len(sketch.actors) <= 2:
-                        smallSketches.append(var)
-                    elif len(sketch.actors) >= 5:
-                        largeSketches.append(var)
+                cost += 2 * numpy.outer(group, group)
+        index = show.index
+        for (s1, s2) in (nonAdjacentSketches or []):
+            for (name1, actors1) in sketchItems(s1):
+                for (name2, actors2) in sketchItems(s2):
+                    banned[index[name1], index[name2]] = banned[index[name2], index[name1]] = True
+        cost[banned] = numpy.inf
+        cheapest = numpy.sort(cost, axis = 1)[:, :2]
+        cheapest[numpy.isinf(cheapest)] = 0 #an item with fewer than two possible neighbours adds nothing it's sure to pay
+        ends = numpy.sort(cheapest.ravel())[len(cheapest.ravel()) - min(2 * numBlocks, cheapest.size):]
+        neighbours = int(math.ceil((cheapest.sum() - ends.sum()) / 2))
+        return max(pigeonhole, neighbours)
+
+    #Precompute cast overlap for a list of item names:
+    #incidence is an actor x item 0/1 matrix, shared[i, j] is the number of actors items i and j have in common,
+    #and triples lists every (i, j, k) with i < j < k where some actor is in all three items (so they can't be back to back)
+    def castMatrices(self, names):
+        items = [self.show.index[name] for name in names]
+        incidence = self.show.incidence[:, items]
+        incidence = incidence[incidence.any(axis = 1)] #only actors in these items
+        shared = self.show.shared[numpy.ix_(items, items)]
+
+        triples = []
+        for (i, j) in zip(*numpy.nonzero(numpy.triu(shared, 1))):
+            common = incidence[:, i] * incidence[:, j]
+            for k in numpy.flatnonzero(common @ incidence):
+                if k > j:
+                    triples.append((i, j, k))
+        return incidence, shared, triples
+
+    #Encode everything about a show that doesn't depend on the director's requests: positions, vignette order, block sizing,
+    #quick changes, vignettes/diddies and big/small preferences. Adds the constraints to the optimizer s and returns the encoding.
+    #If a SolveReport is given, it records the time and number of constraints of each section.
+    #objective and priority (see OBJECTIVES and PRIORITIES) decide how the preferences are handed to the optimizer.
+    def _encodeShow(self, s, numBlocks, encoding, report = None, objective = "soft", priority = None):
+        if numBlocks > len(self.sketches):
+            raise ValueError("Too many blocks, not enough sketches!")
+        if not (encoding in ENCODINGS):
+            raise ValueError("encoding must be one of: " + ", ".join(ENCODINGS))
+        if not (objective in OBJECTIVES):
+            raise ValueError("objective must be one of: " + ", ".join(OBJECTIVES))
+        if not (priority in PRIORITIES):
+            raise ValueError("priority must be None, \"quickChanges\" or \"sizes\"")
+        if report is None:
+            report = SolveReport()
+        s = report.record(s)
 
+        #The name of each sketch (or each vignette within a set) becomes z3 variables in the encoding
+        #Vignettes and diddies, big and small sketches are kept track of for later requirements
+        show = self.show
+        sketchNames = show.names
+        vignetteSets = [[sketchNames[i] for i in vignetteSet] for vignetteSet in show.vignetteSets]
+        vignetteNames = [name for vignetteSet in vignetteSets for name in vignetteSet]
+        diddyNames = [sketchNames[i] for i in numpy.flatnonzero(show.kinds == show.DIDDY)]
+        largeSketches = [sketchNames[i] for i in numpy.flatnonzero(show.sizes >= 5)]
+        smallSketches = [sketchNames[i] for i in numpy.flatnonzero(show.sizes <= 2)]
+
+        blockNames = []
         for i in range(1, numBlocks):
-            var = Int("Block " + str(i))
-            blockVars.append(var)
-        
+            blockNames.append("Block " + str(i))
+
         #every variable must be assigned to a unique and valid position
-        n_total = len(sketchVars) + len(blockVars) #how many total variables to assign
-        all_vars = sketchVars.copy()
-        all_vars.extend(blockVars)
-        for i in range(len(all_vars)):
-            var1 = all_vars[i]
-            s.add(var1 >= 1)
-            s.add(var1 <= n_total)
-            for j in range(i + 1, len(all_vars)):
-                var2 = all_vars[j]
-                s.add(var1 != var2)
+        report.section("positions")
+        enc = ENCODINGS[encoding](sketchNames, blockNames)
+        self.encoding = enc
+        s.add(enc.positions())
+
+        #make sure vignettes end up in proper order
+        report.section("vignettes and diddies")
+        for vignetteSet in vignetteSets:
+            for i in range(1, len(vignetteSet)):
+                s.add(enc.before(vignetteSet[i - 1], vignetteSet[i]))
 
         #make sure blocks are evenly sized
-        vignettesAndDiddies = vignetteVars.copy()
-        vignettesAndDiddies.extend(diddyVars)
-        s.add(self._blockSizing(blockVars, vignettesAndDiddies, n_total)) 
+        report.section("block sizing")
+        vignettesAndDiddies = vignetteNames.copy()
+        vignettesAndDiddies.extend(diddyNames)
+        s.add(enc.blockSizing(vignettesAndDiddies))
+
+        #no triple changes, minimize quick changes
+        #cast overlap is computed once up front, so every pair of sketches gets a single adjacency term weighted by how many
+        #actors they share, instead of one term per shared actor
+        report.section("quick changes")
+        incidence, shared, triples = self.castMatrices(sketchNames)
+        adjacency = {}
+        terms = {"quickChanges": [], "sizes": []} #(adjacency, cost) pairs making up the objective
+        for (i, j) in zip(*numpy.nonzero(numpy.triu(shared, 1))):
+            adjacency[(i, j)] = enc.adjacent(sketchNames[i], sketchNames[j])
+            terms["quickChanges"].append((adjacency[(i, j)], int(shared[i, j])))
+        for (i, j, k) in triples:
+            s.add(Not(enc.tripleChange(sketchNames[i], sketchNames[j], sketchNames[k])))
 
-        #no triple changes, minimize quick changes, make sure we don't exceed maximum quick changes
-        for actor in actorsToSketches.keys():
-            sketchList = actorsToSketches.get(actor)
+        #quick changes of each actor, so _userConstraints can cap them
+        self._actorChanges = []
+        for row in incidence:
+            sketchList = numpy.flatnonzero(row)
             adjacencyVars = []
-            for i in range(len(sketchList)):
-                for j in range(i + 1, len(sketchList)):
-                    s.add_soft(self._adjacent(sketchList[i], sketchList[j]), weight = -1)
-                    adjacencyVars.append(self._adjacent(sketchList[i], sketchList[j]))
-                    for k in range(j + 1, len(sketchList)):
-                        s.add(Not(self._tripleChange(sketchList[i], sketchList[j], sketchList[k])))
-            s.add(Sum(adjacencyVars) <= maxChangesPerActor)
-                                                   
-        #at most one vignette per block
-        bookendedBlockNums = blockVars.copy()
-        bookendedBlockNums.insert(0, 0)
-        bookendedBlockNums.append(n_total + 1)
-        for blockNum in range(1, len(bookendedBlockNums)):
-            start_pos = bookendedBlockNums[blockNum - 1]
-            end_pos = bookendedBlockNums[blockNum]
-            vignettesInBlock = []
-            for vignette in vignetteVars:
-                vignettesInBlock.append(And(vignette > start_pos, vignette < end_pos))
-            for i in range(len(vignettesInBlock)):
-                #for each block b and vignette v, v in b ==> all other vignettes are not in b
-                s.add(Implies(vignettesInBlock[i], Not(Or(Or(vignettesInBlock[:i]), Or(vignettesInBlock[i+1:])))))
-
-        #at most one diddy per block
-        for blockNum in range(1, len(bookendedBlockNums)):
-            start_pos = bookendedBlockNums[blockNum - 1]
-            end_pos = bookendedBlockNums[blockNum]
-            diddiesInBlock = []
-            for diddy in diddyVars:
-                diddiesInBlock.append(And(diddy > start_pos, diddy < end_pos))
-            for i in range(len(diddiesInBlock)):
-                s.add(Implies(diddiesInBlock[i], Not(Or(Or(diddiesInBlock[:i]), Or(diddiesInBlock[i+1:])))))
+            for a in range(len(sketchList)):
+                for b in range(a + 1, len(sketchList)):
+                    adjacencyVars.append(If(adjacency[(sketchList[a], sketchList[b])], 1, 0))
+            self._actorChanges.append(adjacencyVars)
+
+        #at most one vignette per block, at most one diddy per block
+        report.section("vignettes and diddies")
+        s.add(enc.atMostOnePerBlock(vignetteNames))
+        s.add(enc.atMostOnePerBlock(diddyNames))
 
         #vignettes and diddies are not first or last overall; vignettes and diddies are not adjacent
         for i, firstSketch in enumerate(vignettesAndDiddies):
-            s.add(firstSketch != 1)
-            s.add(firstSketch != n_total)
+            s.add(Not(enc.first(firstSketch)))
+            s.add(Not(enc.last(firstSketch)))
             for secondSketch in vignettesAndDiddies[i+1:]:
-                s.add(Not(self._adjacent(firstSketch, secondSketch)))
+                s.add(Not(enc.adjacent(firstSketch, secondSketch)))
 
-        #Prefer no large or small sketches adjacent to one another
-        if requireNoAdjacentBigs:
-            def addBigConstraint(s1, s2):
-                s.add(Not(self._adjacent(s1, s2)))
-        else:
-            def addBigConstraint(s1, s2):
-                s.add_soft(Not(self._adjacent(s1, s2)), weight = 2)
-        for i, firstSketch in enumerate(largeSketches):
-            for secondSketch in largeSketches[i+1:]:
-                addBigConstraint(firstSketch, secondSketch)
-
-        if requireNoAdjacentSmalls:
-            def addSmallConstraint(s1, s2):
-                s.add(Not(self._adjacent(s1, s2)))
+        #Prefer no large or small sketches adjacent to one another (requiring it is up to _userConstraints)
+        report.section("big and small sketches")
+        self._sizePairs = {"requireNoAdjacentBigs": [], "requireNoAdjacentSmalls": []}
+        for (param, sizeGroup) in [("requireNoAdjacentBigs", largeSketches), ("requireNoAdjacentSmalls", smallSketches)]:
+            for i, firstSketch in enumerate(sizeGroup):
+                for secondSketch in sizeGroup[i+1:]:
+                    terms["sizes"].append((enc.adjacent(firstSketch, secondSketch), 2))
+                    self._sizePairs[param].append((firstSketch, secondSketch))
+
+        report.section("objective")
+        if objective == "soft" and priority is None:
+            for (adjacent, cost) in terms["quickChanges"]:
+                s.add_soft(adjacent, weight = -cost)
+            for (adjacent, cost) in terms["sizes"]:
+                s.add_soft(Not(adjacent), weight = cost)
         else:
-            def addSmallConstraint(s1, s2):
-                s.add_soft(Not(self._adjacent(s1, s2)), weight = 2)
-        for i, firstSketch in enumerate(smallSketches):
-            for secondSketch in smallSketches[i+1:]:
-                addSmallConstraint(firstSketch, secondSketch)
-                
+            #with a priority, each part is its own objective, most important first (z3 optimizes several objectives lexicographically)
+            if priority is None:
+                groups = [terms["quickChanges"] + terms["sizes"]]
+            elif priority == "quickChanges":
+                groups = [terms["quickChanges"], terms["sizes"]]
+            else:
+                groups = [terms["sizes"], terms["quickChanges"]]
+            for (groupNum, group) in enumerate(groups):
+                if objective == "minimize":
+                    s.minimize(Sum([If(adjacent, cost, 0) for (adjacent, cost) in group]) if len(group) > 0 else IntVal(0))
+                else:
+                    for (adjacent, cost) in group:
+                        s.add_soft(Not(adjacent), weight = cost, id = "objective " + str(groupNum + 1))
+
+        report.section(None)
+        return enc
+
+    #Encode the director's requests against an encoding made by _encodeShow
+    #Returns a list of (label, constraints) pairs with one readable label per request, e.g. "notInFirstBlock: Cavemen",
+    #so callers can add them outright or switch each request on and off on its own
+    def _userConstraints(self, enc, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                         differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+        requests = []
+
+        #make sure we don't exceed maximum quick changes
+        caps = [Sum(changes) <= maxChangesPerActor for changes in self._actorChanges if len(changes) > maxChangesPerActor]
+        requests.append(("maxChangesPerActor: " + str(maxChangesPerActor), caps))
+
+        #Require no large or small sketches adjacent to one another
+        for (param, required) in [("requireNoAdjacentBigs", requireNoAdjacentBigs), ("requireNoAdjacentSmalls", requireNoAdjacentSmalls)]:
+            if required:
+                requests.append((param, [Not(enc.adjacent(s1, s2)) for (s1, s2) in self._sizePairs[param]]))
+
         #don't place specific sketches next to one another
         if not (nonAdjacentSketches is None):
             for (s1, s2) in nonAdjacentSketches:
                 if (isinstance(s1, Vignettes) and isinstance(s2, Vignettes)) or isinstance(s1, Diddy) and isinstance(s2, Diddy):
                     #already handled this case
                     continue
-                elif isinstance(s1, Vignettes):
-                    var2 = s2.name
-                    for i in range(len(s1.actors)):
-                        name = s1.name + " " + str(i + 1)
-                        var1 = Int(name)
-                        s.add(Not(self._adjacent(var1, var2)))
-                elif isinstance(s2, Vignettes):
-                    #similar as above case but rewriting code for clarity
-                    var1 = s1.name
-                    for i in range(len(s2.actors)):
-                        name = s2.name + " " + str(i + 1)
-                        var1 = Int(name)
-                        s.add(Not(self._adjacent(var1, var2)))
-                else:
-                    s.add(Not(self._adjacent(Int(s1.name), Int(s2.name))))
+                #for vignettes, every vignette in the set is kept away from the other sketch
+                constraints = []
+                for (name1, actors1) in sketchItems(s1):
+                    for (name2, actors2) in sketchItems(s2):
+                        constraints.append(Not(enc.adjacent(name1, name2)))
+                requests.append(("nonAdjacentSketches: " + s1.name + " / " + s2.name, constraints))
 
         #place certain sketches in different blocks from one another
         if not (differentBlockSketches is None):
@@ -320,13 +1382,7 @@ class ShowOrderer:
                 if (isinstance(s1, Vignettes) or isinstance(s2, Vignettes)):
                     raise Exception("Putting vignettes in differentBlockSketches is not supported.")
                 else:
-                    separators = []
-                    s1var = Int(s1.name)
-                    s2var = Int(s2.name)
-                    for var in blockVars:
-                        separators.append(Or(And(s1var > var, s2var < var), And(s1var < var, s2var > var)))
-
-                    s.add(Or(separators))
+                    requests.append(("differentBlockSketches: " + s1.name + " / " + s2.name, [enc.differentBlocks(s1.name, s2.name)]))
 
         #place specific sketches first or last
         if not(desiredFirstSketches is None):
@@ -334,70 +1390,738 @@ class ShowOrderer:
             for sketch in desiredFirstSketches:
                 if isinstance(sketch, Diddy) or isinstance(sketch, Vignettes):
                     raise Exception("This model is designed to not have diddies or vignettes as the first overall sketch.")
-                firstSketchConstraints.append(Int(sketch.name) == 1)
-            s.add(Or(firstSketchConstraints))
+                firstSketchConstraints.append(enc.first(sketch.name))
+            requests.append(("desiredFirstSketches: " + ", ".join(sketch.name for sketch in desiredFirstSketches), [Or(firstSketchConstraints)]))
 
         if not(desiredLastSketches is None):
             lastSketchConstraints = []
             for sketch in desiredLastSketches:
                 if isinstance(sketch, Diddy) or isinstance(sketch, Vignettes):
                     raise Exception("This model is designed to not have diddies or vignettes as the last overall sketch.")
-                lastSketchConstraints.append(Int(sketch.name) == n_total)
-            s.add(Or(lastSketchConstraints))
+                lastSketchConstraints.append(enc.last(sketch.name))
+            requests.append(("desiredLastSketches: " + ", ".join(sketch.name for sketch in desiredLastSketches), [Or(lastSketchConstraints)]))
 
         #Place specific sketches at start of blocks
         if not(blockStartingSketches is None):
             for blockStartingSketch in blockStartingSketches:
                 if isinstance(blockStartingSketch, Vignettes):
                     #do they want all vignettes at start of the block? Just one in particular?
-                    raise Exception("Putting vignettes in blockStartingSketches is not supported.") 
-                constraints = [Int(blockStartingSketch.name) == 1]
-                for blockVar in blockVars:
-                    constraints.append(Int(blockStartingSketch.name) == blockVar + 1)
-                s.add(Or(constraints))
+                    raise Exception("Putting vignettes in blockStartingSketches is not supported.")
+                requests.append(("blockStartingSketches: " + blockStartingSketch.name, [enc.blockStart(blockStartingSketch.name)]))
 
         #Don't place specific sketches in the first block
         if not(notInFirstBlock is None):
             for sketch in notInFirstBlock:
                 if numBlocks > 1:
-                    if isinstance(sketch, Vignettes):
-                        s.add(blockVars[0] < Int(sketch.name + " 1"))
-                    else:
-                        s.add(blockVars[0] < Int(sketch.name))
+                    requests.append(("notInFirstBlock: " + sketch.name, [enc.notInFirstBlock(sketchItems(sketch)[0][0])]))
 
-        print("Searching for show order...")
-        model = s.check()
+        return requests
+
+    #Find the ways an order can be changed without changing its score or breaking any request, so the solver only has to look at
+    #one order out of each such family. Returns (interchangeable, permutableBlocks, reversibleBlocks): interchangeable lists groups
+    #of item names with the same type and cast that no request mentions, permutableBlocks the blocks (0 for the first) whose contents
+    #can be swapped with one another, and reversibleBlocks the blocks that could be played back to front
+    def symmetries(self, numBlocks, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, differentBlockSketches,
+                   blockStartingSketches, notInFirstBlock):
+        show = self.show
+        mentioned = set([])
+        for sketch in (desiredFirstSketches or []) + (desiredLastSketches or []) + (blockStartingSketches or []) + (notInFirstBlock or []):
+            mentioned.update(name for (name, actors) in sketchItems(sketch))
+        for pair in (nonAdjacentSketches or []) + (differentBlockSketches or []):
+            for sketch in pair:
+                mentioned.update(name for (name, actors) in sketchItems(sketch))
+
+        #vignettes are never interchangeable: every one has its own place in its set
+        groups = {}
+        for (i, name) in enumerate(show.names):
+            if show.kinds[i] != show.VIGNETTE and not (name in mentioned):
+                groups.setdefault((int(show.kinds[i]), tuple(sorted(show.casts[i]))), []).append(name)
+        interchangeable = [group for group in groups.values() if len(group) > 1]
+
+        #the first and last blocks are special if vignettes or diddies exist (they can't open or close the show) or if the director
+        #asked for particular first or last sketches; a set of vignettes fixes the order of the blocks it's in, and blockStartingSketches
+        #would end up at the end of a reversed block
+        shorts = bool((show.kinds != show.SKETCH).any())
+        opens = shorts or len(desiredFirstSketches or []) > 0
+        closes = shorts or len(desiredLastSketches or []) > 0
+        permutableBlocks = []
+        if not any(len(vignetteSet) > 1 for vignetteSet in show.vignetteSets):
+            permutableBlocks = [blockNum for blockNum in range(numBlocks)
+                                if not (blockNum == 0 and (opens or len(notInFirstBlock or []) > 0)) and not (blockNum == numBlocks - 1 and closes)]
+            if len(permutableBlocks) < 2:
+                permutableBlocks = []
+        reversibleBlocks = []
+        if len(blockStartingSketches or []) == 0:
+            reversibleBlocks = [blockNum for blockNum in range(numBlocks)
+                                if not (blockNum == 0 and opens) and not (blockNum == numBlocks - 1 and closes)]
+        return (interchangeable, permutableBlocks, reversibleBlocks)
+
+    #Constraints that keep only one order out of every family symmetries found: interchangeable items stay in the order of their
+    #item numbers, permutable blocks are sorted by the lowest item number in each, and every reversible block starts with a lower
+    #item number than it ends with. Interchangeable items count as the same number, so all three can hold at once for some order
+    #in every family.
+    def _symmetryBreaking(self, enc, interchangeable, permutableBlocks, reversibleBlocks):
+        names = self.show.names
+        key = dict(self.show.index)
+        constraints = []
+        for group in interchangeable:
+            group = sorted(group, key = lambda name: key[name])
+            for (name1, name2) in zip(group, group[1:]):
+                constraints.append(enc.before(name1, name2))
+                key[name2] = key[group[0]]
+
+        if len(permutableBlocks) > 0:
+            member = {}
+            for blockNum in permutableBlocks:
+                for name in names:
+                    member[(name, blockNum)] = Bool(name + " in block " + str(blockNum))
+                    constraints.append(member[(name, blockNum)] == enc.inBlock(name, blockNum))
+            for (blockNum, nextBlock) in zip(permutableBlocks, permutableBlocks[1:]):
+                for name in names:
+                    constraints.append(Implies(member[(name, nextBlock)],
+                                               Or([member[(other, blockNum)] for other in names if other != name and key[other] <= key[name]])))
+
+        for blockNum in reversibleBlocks:
+            starts = {name: Bool(name + " starts block " + str(blockNum)) for name in names}
+            ends = {name: Bool(name + " ends block " + str(blockNum)) for name in names}
+            for name in names:
+                constraints.append(starts[name] == And(enc.blockStart(name), enc.inBlock(name, blockNum)))
+                constraints.append(ends[name] == And(enc.blockEnd(name), enc.inBlock(name, blockNum)))
+            for name in names:
+                constraints.append(Implies(starts[name], Or([ends[other] for other in names if key[other] >= key[name]])))
+        return constraints
+
+    def orderShow(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                  differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, timeout,
+                  encoding = "int", onModel = None, seedOrder = None, solverOptions = None, onImprove = None, objective = "soft",
+                  strategy = None, priority = None, breakSymmetries = True):
+        #most input checking is done by driver function intended to call this one
+        #onModel gets every model z3 finds; onImprove gets (show order, score, seconds since this call) for every better order found
+        #objective, strategy and priority pick how z3 is asked to optimize (see OBJECTIVES, MAXSAT_STRATEGIES and PRIORITIES)
+        #breakSymmetries rules out orders that only differ from another one in ways symmetries says can't matter
+        #Without a priority, the search stops early once an order scores as well as lowerBound says any order can.
+        #Returns a SolveReport, which is also kept as self.report (nothing is printed)
+
+        start = time.perf_counter()
+        report = SolveReport()
+        self.report = report
+        s = Optimize()
+        s.set("timeout", timeout)
+        if not (strategy is None):
+            if not (strategy in MAXSAT_STRATEGIES):
+                raise ValueError("strategy must be one of: " + ", ".join(MAXSAT_STRATEGIES))
+            s.set("maxsat_engine", MAXSAT_STRATEGIES[strategy])
+        for (option, value) in (solverOptions or {}).items():
+            s.set(option, value) #e.g. {"random_seed": 7, "maxsat_engine": "wmax"}
+        #Ok, a couple notes on this "s" object:
+        #This is an optimizer from the z3 library
+        #We'll add a bunch of hard and soft constraints, and it will look for the best show order based on those constraints
+        #With the default "int" encoding, this happens by adding an int variable corresponding to each sketch. It will assign each
+            #variable an integer based on constraints we give it. Those integers correspond to a sketch's order in the show
+        #The "bool" encoding instead has one true/false variable per sketch and position (see BoolEncoding above)
+        #(Makes sure to satisfy all of the hards and as many softs as possible, based on weighting of soft constraints)
+        #"Timeout" parameter makes sure it stops after certain time with best order it has found so far
+        #Otherwise it will search for a really long time looking for the best possible order
+        #More info: https://ericpony.github.io/z3py-tutorial/
+        enc = self._encodeShow(s, numBlocks, encoding, report, objective, priority)
+        report.section("user constraints")
+        recorder = report.record(s)
+        for (label, constraints) in self._userConstraints(enc, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches,
+                                                          nonAdjacentSketches, differentBlockSketches, blockStartingSketches,
+                                                          requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+            recorder.add(constraints)
+        if breakSymmetries:
+            report.section("symmetry breaking")
+            recorder.add(self._symmetryBreaking(enc, *self.symmetries(numBlocks, desiredFirstSketches, desiredLastSketches,
+                                                                      nonAdjacentSketches, differentBlockSketches,
+                                                                      blockStartingSketches, notInFirstBlock)))
+        report.section(None)
+
+        #prime the solver with the seed order, and remember it as the order to beat if it meets every hard requirement
+        seedScore = None
+        if not (seedOrder is None):
+            search = self._localSearch(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                       differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                       notInFirstBlock)
+            seedOrder = self._seedOrder(search, seedOrder)
+            for (var, value) in enc.initialValues(seedOrder):
+                s.set_initial_value(var, value)
+            soft, hard, changes = search.evaluate(search.encode(seedOrder))
+            if hard == 0:
+                seedScore = self._objectiveKey(seedOrder, priority)
+
+        report.lowerBound = self.lowerBound(numBlocks, nonAdjacentSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs)
+        reachedBound = threading.Event()
+        finished = threading.Event()
+        best = [] #objective key of the best order so far
+        def watch():
+            #z3 ignores an interrupt from inside its own callback, so stop it from here, until it has stopped
+            while not finished.is_set():
+                if reachedBound.is_set():
+                    main_ctx().interrupt()
+                finished.wait(0.05)
+        def modelFound(model):
+            if not (onModel is None):
+                onModel(model)
+            showOrder = enc.decode(model)
+            if showOrder is None:
+                return
+            score = self.scoreOrder(showOrder)
+            key = self._objectiveKey(showOrder, priority)
+            if len(best) == 0 or key < best[0]:
+                best[:] = [key]
+                elapsed = time.perf_counter() - start
+                report.improvements.append((elapsed, score))
+                if not (onImprove is None):
+                    onImprove(showOrder, score, elapsed)
+            if priority is None and score <= report.lowerBound:
+                reachedBound.set() #lowerBound bounds the combined score, so it can't tell when a priority has been met
+        s.set_on_model(modelFound)
+
+        self.encodeTime = time.perf_counter() - start
+        report.encodeTime = self.encodeTime
+        if not (seedScore is None) and priority is None and seedScore <= report.lowerBound:
+            #the seed is already as good as it gets
+            self.order = seedOrder
+            self.status = report.status = "optimal"
+            report.order = seedOrder
+            report.objective = seedScore
+            report.gap = 0
+            report.searchTime = 0
+            return report
+        watcher = threading.Thread(target = watch, daemon = True)
+        watcher.start()
+        try:
+            model = s.check()
+        finally:
+            finished.set()
+        report.searchTime = time.perf_counter() - start - report.encodeTime
+        statistics = s.statistics()
+        report.statistics = {key: statistics.get_key_value(key) for key in statistics.keys()}
         if model == unsat:
-            raise Exception("There are no show orders that satisfy all hard constraints. Try loosening hard constraints.")
-        return s.model()
+            report.status = "unsat"
+            raise self._conflict(core = self.explainConflict(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches,
+                                                             nonAdjacentSketches, differentBlockSketches, blockStartingSketches,
+                                                             requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, timeout,
+                                                             encoding))
+        try:
+            self.order = enc.decode(s.model())
+        except Z3Exception:
+            self.order = None #ran out of time before finding any order
+        if not (seedScore is None) and (self.order is None or self._objectiveKey(self.order, priority) > seedScore):
+            self.order = seedOrder #the solver didn't beat the seed within the time limit
+        report.order = self.order
+        report.objective = None if self.order is None else self.scoreOrder(self.order)
+        #z3 only answers sat once it has proven the order is the best one
+        self.status = self._status(report.objective, report.lowerBound, model == sat, priority)
+        report.status = self.status
+        report.gap = None if report.objective is None else report.objective - report.lowerBound
+        return report
 
-    def print_order(self, model, sketchesToActors):
-        if len(model) == 0:
+    #"optimal", "within X of bound" or "timeout" for an order with the given score (None if there is no order)
+    #lowerBound is for the combined score, so with a priority an order reaching it can still lose on the more important part,
+    #and only proven counts
+    def _status(self, score, lowerBound, proven = False, priority = None):
+        if score is None:
+            return "timeout"
+        if proven or (priority is None and score <= lowerBound):
+            return "optimal"
+        return "within " + str(score - lowerBound) + " of bound"
+
+    #Same inputs as orderShow, but finds up to k different orders with one solver: after every order, the solver is told that the
+    #next one has to put at least minDistance sketches (or vignettes) in a different position than every order found so far.
+    #The time is split evenly between the orders still to find. Returns [(show order, score)], best score first
+    #(best by priority first, with a priority).
+    def diverseOrders(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                      differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                      timeout, k, minDistance = 2, encoding = "int", objective = "soft", strategy = None, priority = None,
+                      breakSymmetries = True):
+        if not (isinstance(k, int) and k >= 1):
+            raise ValueError("k must be a positive integer")
+        if not (isinstance(minDistance, int) and minDistance >= 1):
+            raise ValueError("minDistance must be a positive integer")
+
+        print("Encoding constraints...")
+        start = time.perf_counter()
+        s = Optimize()
+        if not (strategy is None):
+            if not (strategy in MAXSAT_STRATEGIES):
+                raise ValueError("strategy must be one of: " + ", ".join(MAXSAT_STRATEGIES))
+            s.set("maxsat_engine", MAXSAT_STRATEGIES[strategy])
+        enc = self._encodeShow(s, numBlocks, encoding, objective = objective, priority = priority)
+        for (label, constraints) in self._userConstraints(enc, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches,
+                                                          nonAdjacentSketches, differentBlockSketches, blockStartingSketches,
+                                                          requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+            s.add(constraints)
+        if breakSymmetries:
+            #orders that only differ by symmetries are the same order as far as the director is concerned
+            s.add(self._symmetryBreaking(enc, *self.symmetries(numBlocks, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                                               differentBlockSketches, blockStartingSketches, notInFirstBlock)))
+
+        orders = []
+        while len(orders) < k:
+            remaining = timeout / 1000 - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            s.set("timeout", max(1, int(remaining * 1000 / (k - len(orders)))))
+            print("Searching for show order " + str(len(orders) + 1) + " of " + str(k) + "...")
+            result = s.check()
+            if result == unsat:
+                if len(orders) == 0:
+                    raise self._conflict(core = self.explainConflict(numBlocks, maxChangesPerActor, desiredFirstSketches,
+                                                                     desiredLastSketches, nonAdjacentSketches, differentBlockSketches,
+                                                                     blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                                                     notInFirstBlock, timeout, encoding))
+                break #every other valid order is too close to one already found
+            try:
+                showOrder = enc.decode(s.model())
+            except Z3Exception:
+                showOrder = None
+            if showOrder is None or showOrder in [found for (found, score) in orders]:
+                break #ran out of time before finding another order
+            orders.append((showOrder, self.scoreOrder(showOrder)))
+
+            #the next order must move at least minDistance sketches away from where this one put them
+            moved = [If(enc.at(name, position + 1), 0, 1) for (position, name) in enumerate(showOrder) if name in self.show.index]
+            s.add(Sum(moved) >= minDistance)
+
+        orders.sort(key = lambda found: self._objectiveKey(found[0], priority))
+        self.order = None if len(orders) == 0 else orders[0][0]
+        return orders
+
+    #Build the LocalSearch for a set of orderShow inputs; used by the local backend and to check seed orders
+    def _localSearch(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                     differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+        nonAdjacentPairs = []
+        for (s1, s2) in (nonAdjacentSketches or []):
+            if (isinstance(s1, Vignettes) and isinstance(s2, Vignettes)) or isinstance(s1, Diddy) and isinstance(s2, Diddy):
+                continue #vignettes and diddies are never adjacent anyway
+            for (name1, actors1) in sketchItems(s1):
+                for (name2, actors2) in sketchItems(s2):
+                    nonAdjacentPairs.append((name1, name2))
+        for (s1, s2) in (differentBlockSketches or []):
+            if (isinstance(s1, Vignettes) or isinstance(s2, Vignettes)):
+                raise Exception("Putting vignettes in differentBlockSketches is not supported.")
+        for sketch in (desiredFirstSketches or []) + (desiredLastSketches or []):
+            if isinstance(sketch, Diddy) or isinstance(sketch, Vignettes):
+                raise Exception("This model is designed to not have diddies or vignettes as the first or last overall sketch.")
+        for sketch in (blockStartingSketches or []):
+            if isinstance(sketch, Vignettes):
+                raise Exception("Putting vignettes in blockStartingSketches is not supported.")
+
+        return LocalSearch(self.show, numBlocks, maxChangesPerActor,
+                           None if desiredFirstSketches is None else [sketch.name for sketch in desiredFirstSketches],
+                           None if desiredLastSketches is None else [sketch.name for sketch in desiredLastSketches],
+                           nonAdjacentPairs, [(s1.name, s2.name) for (s1, s2) in (differentBlockSketches or [])],
+                           [sketch.name for sketch in (blockStartingSketches or [])],
+                           [sketchItems(sketch)[0][0] for sketch in (notInFirstBlock or [])],
+                           requireNoAdjacentSmalls, requireNoAdjacentBigs)
+
+    #Turn a seedOrder argument into a full show order (as names, with block separators named "Block 1", "Block 2", ...)
+    #seedOrder is either "greedy" for a quick low-overlap order, or a previous or hand-written order as a list of names
+    def _seedOrder(self, search, seedOrder):
+        if isinstance(seedOrder, str):
+            if seedOrder != "greedy":
+                raise ValueError("seedOrder must be a list of sketch names, \"greedy\" or None")
+            return search.decode(search.greedyOrder(random.Random()))
+        if not isinstance(seedOrder, list):
+            raise TypeError("seedOrder must be a list of sketch names, \"greedy\" or None")
+        return search.decode(search.encode(seedOrder))
+
+    #Same inputs as orderShow, but searches with LocalSearch instead of z3 and returns the show order directly
+    def searchShow(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                   differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, timeout,
+                   onImprove = None, seedOrder = None):
+        if numBlocks > len(self.sketches):
+            raise ValueError("Too many blocks, not enough sketches!")
+
+        print("Preparing local search...")
+        start = time.perf_counter()
+        search = self._localSearch(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                   differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                   notInFirstBlock)
+        startOrder = None if seedOrder is None else self._seedOrder(search, seedOrder)
+        bound = self.lowerBound(numBlocks, nonAdjacentSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs)
+        self.encodeTime = time.perf_counter() - start
+        print("Searching for show order...")
+        self.order = search.search(timeout / 1000, onImprove, startOrder = startOrder, target = bound)
+        self.status = self._status(None if self.order is None else self.scoreOrder(self.order), bound)
+        return self.order
+
+    #Same inputs as orderShow, but solves in two phases for shows too big for one model:
+    #phase one assigns every sketch to a block (balance, one vignette and one diddy per block, vignette order across blocks,
+    #differentBlockSketches, notInFirstBlock, first/last blocks), keeping sketches that share actors in different blocks where it can;
+    #phase two orders every block on its own, all blocks in parallel, splitting each actor's maxChangesPerActor between the blocks.
+    #The two phases alternate, ruling out each block assignment once it has been tried, until one doesn't improve the show.
+    def decomposeShow(self, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                      differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                      timeout, workers = None, onImprove = None):
+        if numBlocks > len(self.sketches):
+            raise ValueError("Too many blocks, not enough sketches!")
+        start = time.perf_counter()
+        timeout = timeout / 1000
+        search = self._localSearch(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                   differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                   notInFirstBlock)
+        names = self.show.names
+        kinds = {name: self.show.KIND_NAMES[kind] for (name, kind) in zip(names, self.show.kinds)}
+        actorNames = {name: self.show.cast(name) for name in names}
+        firsts = None if desiredFirstSketches is None else [sketch.name for sketch in desiredFirstSketches]
+        lasts = None if desiredLastSketches is None else [sketch.name for sketch in desiredLastSketches]
+        blockStarts = [sketch.name for sketch in (blockStartingSketches or [])]
+        nonAdjacentPairs = [(search.names[a], search.names[b]) for a in range(search.n) for b in range(a + 1, search.n)
+                            if search.pairHard[a][b] > 0 and not (kinds[search.names[a]] != "sketch" and kinds[search.names[b]] != "sketch")]
+
+        print("Encoding block assignment...")
+        phaseOne = Optimize()
+        blockOf = {name: Int(name + " block") for name in names}
+        for name in names:
+            phaseOne.add(blockOf[name] >= 0, blockOf[name] < numBlocks)
+        for blockNum in range(numBlocks):
+            inBlock = {name: blockOf[name] == blockNum for name in names}
+            regulars = Sum([If(inBlock[name], 1, 0) for name in names if kinds[name] == "sketch"])
+            shorts = Sum([If(inBlock[name], 1, 0) for name in names if kinds[name] != "sketch"])
+            #vignettes/diddies need regular sketches between them, and can't open or close the show
+            ends = (blockNum == 0) + (blockNum == numBlocks - 1)
+            phaseOne.add(shorts <= regulars + 1 - ends)
+            phaseOne.add(regulars >= 1)
+            for kind in ["vignette", "diddy"]:
+                phaseOne.add(AtMost(*([inBlock[name] for name in names if kinds[name] == kind] + [1])))
+            if len(blockStarts) > 1:
+                phaseOne.add(AtMost(*([inBlock[name] for name in blockStarts] + [1])))
+        lengths = [Sum([If(blockOf[name] == blockNum, 2 if kinds[name] == "sketch" else 1, 0) for name in names])
+                   for blockNum in range(numBlocks)]
+        for i in range(numBlocks):
+            for j in range(i + 1, numBlocks):
+                phaseOne.add(lengths[i] - lengths[j] <= 2, lengths[i] - lengths[j] >= -2)
+        for vignetteSet in search.vignetteSets:
+            for k in range(1, len(vignetteSet)):
+                phaseOne.add(blockOf[search.names[vignetteSet[k - 1]]] < blockOf[search.names[vignetteSet[k]]])
+        for (a, b) in search.differentBlockPairs:
+            phaseOne.add(blockOf[search.names[a]] != blockOf[search.names[b]])
+        for item in search.notInFirstBlock:
+            phaseOne.add(blockOf[search.names[item]] >= 1)
+        if not (firsts is None):
+            phaseOne.add(Or([blockOf[name] == 0 for name in firsts]))
+            for name in blockStarts:
+                if not (name in firsts):
+                    phaseOne.add(blockOf[name] != 0)
+        if not (lasts is None):
+            phaseOne.add(Or([blockOf[name] == numBlocks - 1 for name in lasts]))
+
+        #an actor in m of the k sketches of a block can't avoid at least m - ceil(k / 2) quick changes in it,
+        #and those forced changes across all blocks have to fit in maxChangesPerActor
+        for actor in set(actor for name in names for actor in actorNames[name]):
+            forced = []
+            for blockNum in range(numBlocks):
+                m = Sum([If(blockOf[name] == blockNum, 1, 0) for name in names if actor in actorNames[name]])
+                k = Sum([If(blockOf[name] == blockNum, 1, 0) for name in names])
+                forced.append(Int(actor + " forced changes in block " + str(blockNum)))
+                phaseOne.add(forced[-1] >= 0, 2 * forced[-1] >= 2 * m - k - 1)
+            phaseOne.add(Sum(forced) <= maxChangesPerActor)
+
+        #sketches sharing actors (or both big/both small) can only end up adjacent if they're in the same block
+        together = []
+        for a in range(search.n):
+            for b in range(a + 1, search.n):
+                if search.pairSoft[a][b] > 0:
+                    together.append(If(blockOf[search.names[a]] == blockOf[search.names[b]], search.pairSoft[a][b], 0))
+        phaseOne.minimize(Sum(together) if len(together) > 0 else IntVal(0))
+
+        best = None
+        bestScore = None
+        bound = self.lowerBound(numBlocks, nonAdjacentSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs)
+        self.encodeTime = time.perf_counter() - start
+        pool = concurrent.futures.ProcessPoolExecutor(workers)
+        phaseOneTime = timeout / 20 #a good assignment now beats the best one later
+        try:
+            while time.perf_counter() - start < timeout:
+                remaining = timeout - (time.perf_counter() - start)
+                phaseOne.set("timeout", max(1, int(min(remaining, phaseOneTime) * 1000)))
+                print("Assigning sketches to blocks...")
+                result = phaseOne.check()
+                if result == unsat:
+                    #every assignment tried so far was ruled out, but some only because the heuristics above couldn't order
+                    #them, so only the full model can tell whether the show really has no order
+                    if best is None:
+                        remaining = timeout - (time.perf_counter() - start)
+                        core = self.explainConflict(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches,
+                                                    nonAdjacentSketches, differentBlockSketches, blockStartingSketches,
+                                                    requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                                                    max(1, int(remaining * 1000)))
+                        if not (core is None):
+                            raise self._conflict(core = core)
+                    break
+                try:
+                    model = phaseOne.model()
+                except Z3Exception:
+                    model = None
+                if model is None or len(model) == 0:
+                    phaseOneTime *= 2 #ran out of time before finding another assignment; give it longer next time
+                    continue
+                assignment = {name: model.eval(blockOf[name]).as_long() for name in names}
+                phaseOne.add(Or([blockOf[name] != assignment[name] for name in names])) #never try this assignment again
+                blocks = [[name for name in names if assignment[name] == blockNum] for blockNum in range(numBlocks)]
+
+                #every block may start out using an actor's whole quick change budget, and blocks minimize their own quick changes;
+                #whenever actors still go over budget in total, every block where they have a change is ordered again (in parallel,
+                #from its previous order) with only what the other blocks leave of each actor's budget, and the block that brings
+                #the most quick changes back within budget keeps its new order
+                def orderBlock(blockNum, blockCaps, seedOrder = None):
+                    block = blocks[blockNum]
+                    remaining = timeout - (time.perf_counter() - start)
+                    return pool.submit(_orderBlock, block, {name: actorNames[name] for name in block}, {name: kinds[name] for name in block},
+                                       blockNum == 0, blockNum == numBlocks - 1, firsts, lasts, [name for name in blockStarts if name in block],
+                                       [(x, y) for (x, y) in nonAdjacentPairs if x in block and y in block], blockCaps,
+                                       requireNoAdjacentSmalls, requireNoAdjacentBigs, max(1, int(remaining * 500)), seedOrder)
+                def changesUsed(blockOrder):
+                    used = {}
+                    for (x, y) in zip(blockOrder, blockOrder[1:]):
+                        for actor in set(actorNames[x]) & set(actorNames[y]):
+                            used[actor] = used.get(actor, 0) + 1
+                    return used
+                def overBudget(used):
+                    total = {}
+                    for blockUse in used:
+                        for (actor, count) in blockUse.items():
+                            total[actor] = total.get(actor, 0) + count
+                    return sum(max(0, count - maxChangesPerActor) for count in total.values())
+
+                print("Ordering blocks...")
+                futures = [orderBlock(blockNum, {actor: maxChangesPerActor for name in blocks[blockNum] for actor in actorNames[name]})
+                           for blockNum in range(numBlocks)]
+                blockOrders = [future.result() for future in futures]
+                for (blockNum, blockOrder) in enumerate(blockOrders):
+                    if blockOrder is None:
+                        #no other assignment may put exactly these sketches in this block either
+                        phaseOne.add(Or([blockOf[name] != blockNum if name in blocks[blockNum] else blockOf[name] == blockNum
+                                         for name in names]))
+                if any(not blockOrder for blockOrder in blockOrders):
+                    continue #this assignment can't be ordered; it has been ruled out, so try the next one
+
+                used = [changesUsed(blockOrder) for blockOrder in blockOrders]
+                while overBudget(used) > 0 and time.perf_counter() - start < timeout:
+                    attempts = {}
+                    for blockNum in range(numBlocks):
+                        blockCaps = {}
+                        for name in blocks[blockNum]:
+                            for actor in actorNames[name]:
+                                blockCaps[actor] = maxChangesPerActor - sum(used[otherNum].get(actor, 0) for otherNum in range(numBlocks)
+                                                                            if otherNum != blockNum)
+                        if any(used[blockNum].get(actor, 0) > cap for (actor, cap) in blockCaps.items()) and min(blockCaps.values()) >= 0:
+                            attempts[blockNum] = orderBlock(blockNum, blockCaps, blockOrders[blockNum])
+                    results = []
+                    for (blockNum, future) in attempts.items():
+                        blockOrder = future.result()
+                        if blockOrder:
+                            newUsed = list(used)
+                            newUsed[blockNum] = changesUsed(blockOrder)
+                            results.append((overBudget(newUsed), self.scoreOrder(blockOrder), blockNum, blockOrder))
+                    if len(results) == 0:
+                        break #no block can give up the quick changes that are over budget
+                    excess, score, blockNum, blockOrder = min(results, key = lambda result: result[:2])
+                    blockOrders[blockNum] = blockOrder
+                    used[blockNum] = changesUsed(blockOrder)
+                if overBudget(used) > 0:
+                    continue
+
+                showOrder = []
+                for (blockNum, blockOrder) in enumerate(blockOrders):
+                    if blockNum > 0:
+                        showOrder.append("Block " + str(blockNum))
+                    showOrder.extend(blockOrder)
+                soft, hard, changes = search.evaluate(search.encode(showOrder))
+                if hard > 0:
+                    continue
+                if not (bestScore is None) and soft >= bestScore:
+                    break #no improvement from this round
+                best = showOrder
+                bestScore = soft
+                if not (onImprove is None):
+                    onImprove(best, bestScore)
+                if bestScore <= bound:
+                    break #as good as any order can be
+        finally:
+            pool.shutdown(wait = False, cancel_futures = True)
+
+        self.status = self._status(bestScore, bound)
+        self.order = best
+        return self.order
+
+    #Same inputs as orderShow (without the search options), but writes the whole model to path instead of solving it, so it can be
+    #solved by another engine or on another machine. format is "smt2", "wcnf" or "opb" (by default taken from the extension of path,
+    #see EXPORT_FORMATS). SMT-LIB2 keeps z3's variable names (sketch names, "Block 1", "Sketch 1 @ 3", ...); WCNF and OPB need the
+    #Boolean encoding, number their variables and list the number of every named one in a comment. Without a priority, the
+    #WCNF/OPB weights are the score of an order; with one, the more important part is weighted so that it always wins. The first
+    #comment in the file is what importSolution needs to turn a solver's answer back into a show order. Returns the format written.
+    def exportModel(self, path, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                    differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                    encoding = None, format = None, objective = "soft", priority = None, breakSymmetries = True):
+        if format is None:
+            format = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if not (format in EXPORT_FORMATS.values()):
+            raise ValueError("format must be one of: " + ", ".join(EXPORT_FORMATS.values()))
+        if encoding is None:
+            encoding = "int" if format == "smt2" else "bool"
+        if format != "smt2" and encoding != "bool":
+            raise ValueError("Only the Boolean encoding can be exported as " + format)
+
+        s = _Collector()
+        enc = self._encodeShow(s, numBlocks, encoding, objective = objective if format == "smt2" else "soft", priority = priority)
+        for (label, constraints) in self._userConstraints(enc, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches,
+                                                          nonAdjacentSketches, differentBlockSketches, blockStartingSketches,
+                                                          requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
+            s.add(constraints)
+        if breakSymmetries:
+            s.add(self._symmetryBreaking(enc, *self.symmetries(numBlocks, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                                               differentBlockSketches, blockStartingSketches, notInFirstBlock)))
+        header = json.dumps({"format": format, "encoding": encoding, "names": enc.names, "blockNames": enc.blockNames})
+
+        if format == "smt2":
+            opt = Optimize()
+            opt.add(s.hard)
+            for (constraint, weight, id) in s.soft:
+                opt.add_soft(constraint, weight = weight, id = id)
+            for objective in s.objectives:
+                opt.minimize(objective)
+            with open(path, "w") as f:
+                f.write("; showorderer " + header + "\n")
+                f.write(opt.sexpr())
+                f.write("(check-sat)\n(get-model)\n")
+            return format
+
+        #one penalty variable per soft constraint, true when the soft constraint is broken; with a priority, every broken soft
+        #constraint of the more important part costs more than breaking all of the less important part
+        weights = {}
+        for (constraint, weight, id) in s.soft:
+            weights[id] = weights.get(id, 0) + weight
+        scale = {None: 1, "objective 2": 1, "objective 1": weights.get("objective 2", 0) + 1}
+        penalties = []
+        goal = Goal()
+        goal.add(s.hard)
+        for (i, (constraint, weight, id)) in enumerate(s.soft):
+            penalty = Bool("penalty " + str(i + 1))
+            goal.add(penalty == Not(constraint))
+            penalties.append((penalty, weight * scale[id]))
+
+        #z3 turns the cardinality and pseudo-boolean constraints into circuits, and _Cnf turns those into clauses.
+        #Placement variables come first, so variable numbers only depend on the show, not on the requests
+        cnf = _Cnf()
+        for name in enc.names + enc.blockNames:
+            for p in enc.slots:
+                cnf.variable(enc.vars[name][p], name + " @ " + str(p))
+        penalties = [(cnf.variable(penalty, str(penalty)), weight) for (penalty, weight) in penalties]
+        blasted = Then("simplify", "card2bv", "simplify", "bit-blast")(goal)
+        for formula in blasted[0]:
+            cnf.add(formula)
+        named = [(v + 1, name) for (v, name) in enumerate(cnf.names) if not (name is None)]
+
+        with open(path, "w") as f:
+            if format == "wcnf":
+                top = sum(weight for (penalty, weight) in penalties) + 1
+                f.write("c showorderer " + header + "\n")
+                f.writelines("c " + str(v) + " " + name + "\n" for (v, name) in named)
+                f.write("p wcnf " + str(len(cnf.names)) + " " + str(len(cnf.clauses) + len(penalties)) + " " + str(top) + "\n")
+                f.writelines(str(top) + " " + " ".join(str(literal) for literal in clause) + " 0\n" for clause in cnf.clauses)
+                f.writelines(str(weight) + " " + str(-penalty) + " 0\n" for (penalty, weight) in penalties)
+            else:
+                f.write("* #variable= " + str(len(cnf.names)) + " #constraint= " + str(len(cnf.clauses)) + "\n")
+                f.write("* showorderer " + header + "\n")
+                f.writelines("* " + str(v) + " " + name + "\n" for (v, name) in named)
+                if len(penalties) > 0:
+                    f.write("min: " + " ".join("+" + str(weight) + " x" + str(penalty) for (penalty, weight) in penalties) + " ;\n")
+                #a clause is at least one of its literals being true, and a negated literal x is 1 - x
+                for clause in cnf.clauses:
+                    terms = " ".join(("+1 x" if literal > 0 else "-1 x") + str(abs(literal)) for literal in clause)
+                    f.write(terms + " >= " + str(1 - sum(1 for literal in clause if literal < 0)) + " ;\n")
+        return format
+
+    #Turn a solver's answer to a model written by exportModel back into a show order, for print_order. modelPath is the exported file
+    #and solutionPath the solver's output: an SMT-LIB model ((define-fun ...) for every variable) for smt2, or the "v" lines of a
+    #MaxSAT or pseudo-boolean solver (literals like "-12" or "x12", or a string of 0s and 1s) for wcnf and opb. The order is also
+    #kept as self.order. Raises the same exception as order() if the solver says there is no valid order.
+    def importSolution(self, modelPath, solutionPath):
+        header = None
+        names = {} #variable number -> name, for wcnf and opb
+        with open(modelPath) as f:
+            for line in f:
+                if not (line[:1] in [";", "c", "*"]):
+                    break
+                comment = line[1:].strip()
+                if comment.startswith("showorderer "):
+                    header = json.loads(comment[len("showorderer "):])
+                elif not (header is None) and comment.split(" ", 1)[0].isdigit():
+                    number, name = comment.split(" ", 1)
+                    names[int(number)] = name
+        if header is None:
+            raise ValueError(modelPath + " was not written by exportModel")
+        if set(header["names"]) != set(self.show.names):
+            raise ValueError(modelPath + " was exported for a different show")
+        with open(solutionPath) as f:
+            solution = f.read()
+
+        values = {} #variable name -> True/False or position
+        if header["format"] == "smt2":
+            if re.search(r"^\s*unsat\b", solution, re.MULTILINE):
+                raise Exception("There are no show orders that satisfy all hard constraints.")
+            for (name, value) in re.findall(r"\(define-fun\s+(\|[^|]*\||[^\s()]+)\s+\(\)\s+\w+\s+(true|false|\d+)\s*\)", solution):
+                values[name.strip("|")] = int(value) if value.isdigit() else value == "true"
+        else:
+            if re.search(r"^s\s+UNSAT", solution, re.MULTILINE):
+                raise Exception("There are no show orders that satisfy all hard constraints.")
+            for line in solution.splitlines():
+                tokens = line.split()
+                if len(tokens) == 0 or tokens[0] != "v":
+                    continue
+                if len(tokens) == 2 and len(tokens[1]) > 1 and set(tokens[1]) <= set("01"):
+                    for (i, bit) in enumerate(tokens[1]):
+                        if i + 1 in names:
+                            values[names[i + 1]] = bit == "1"
+                    continue
+                for token in tokens[1:]:
+                    number = int(token.lstrip("-~x"))
+                    if number in names:
+                        values[names[number]] = not (token[0] in "-~")
+        if len(values) == 0:
+            raise ValueError(solutionPath + " has no assignment in it")
+
+        items = header["names"] + header["blockNames"]
+        if header["encoding"] == "bool":
+            showOrder = []
+            for p in range(1, len(items) + 1):
+                placed = [name for name in items if values.get(name + " @ " + str(p)) is True]
+                if len(placed) != 1:
+                    raise ValueError("The solution doesn't put exactly one sketch at position " + str(p))
+                showOrder.append(placed[0])
+        else:
+            positions = {name: values.get(name) for name in items}
+            if set(positions.values()) != set(range(1, len(items) + 1)):
+                raise ValueError("The solution doesn't give every sketch its own position")
+            showOrder = sorted(items, key = lambda name: positions[name])
+        self.order = showOrder
+        return showOrder
+
+    #sketchesToActors maps item names to their actors; by default the casts the ShowOrderer was made with are printed
+    def print_order(self, showOrder, sketchesToActors = None):
+        if showOrder is None:
             print("Could not find a show order that satisfies all hard constraints within the time allotted. Try loosening hard constraints or increasing time limit.")
             return
-            
-        print("Done.\n")
-        numsToSketches = {}
-        for var in model:
-            numsToSketches[model[var].as_long()] = var
 
-        for i in range(1, len(model) + 1):
-            sketch = str(numsToSketches[i])
+        print("Done.\n")
+        for sketch in showOrder:
             if sketch[:5] == "Block":
                 print("---------------BLOCK---------------")
-            else: 
+            else:
                 print(sketch, end = ": ")
-                for actor in sketchesToActors[sketch]:
-                    print(actor.name, end = " ")
+                actorNames = self.show.cast(sketch) if sketchesToActors is None else [actor.name for actor in sketchesToActors[sketch]]
+                for actor in actorNames:
+                    print(actor, end = " ")
                 print("")
 
-def order(sketches, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches = None, desiredLastSketches = None, 
-          nonAdjacentSketches = None, differentBlockSketches = None, blockStartingSketches = None, requireNoAdjacentSmalls = False, 
-          requireNoAdjacentBigs = False, notInFirstBlock = None, timeout = 60):
-    print("Checking inputs...")
-    orderer = ShowOrderer(sketches)
-
-    #input checking: (sketches parameter is already checked by init of ShowOrderer class)
+#Input checking shared by order() and ShowSession (the sketches themselves are checked by the init of ShowOrderer,
+#whose compiled show is passed in)
+def checkInputs(show, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock):
     if not isinstance(numBlocks, int):
         raise TypeError("Please provide a positive integer number of blocks")
     if numBlocks <= 0:
@@ -415,7 +2139,7 @@ def order(sketches, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches
             for sketch in listOfSketches:
                 if not isinstance(sketch, Sketch):
                     raise TypeError(parameterName + " must be a list of sketches (or None)")
-                if not (sketch in sketches):
+                if not (id(sketch) in show.sketchIds):
                     raise ValueError("Every sketch in " + parameterName + " must be in the list of sketches you provided.")
 
     checkList(desiredFirstSketches, "desiredFirstSketches")
@@ -432,7 +2156,7 @@ def order(sketches, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches
             for pair in listOfTuples:
                 if not(len(pair) == 2 and isinstance(pair[0], Sketch) and isinstance(pair[1], Sketch)):
                     raise TypeError(parameterName + " must be a list of pairs (tuples) of sketches (or None)")
-                if not(pair[0] in sketches and pair[1] in sketches):
+                if not(id(pair[0]) in show.sketchIds and id(pair[1]) in show.sketchIds):
                     raise ValueError("Every sketch in " + parameterName + " must be in the list of sketches you provided.")
 
     checkListOfTuples(nonAdjacentSketches, "nonAdjacentSketches")
@@ -444,50 +2168,863 @@ def order(sketches, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches
     if not isinstance(requireNoAdjacentBigs, bool):
         raise TypeError("requireNoAdjacentBigs must be True or False")
 
+#Best orders found so far, stored in a JSON file and looked up by a hash of the show (sketches, their casts and numBlocks) and of
+#the director's requests, so re-running the same show is instant and re-running a slightly changed show starts from a good order.
+#Holds at most maxEntries shows, dropping the one used least recently when full. A cached show counts as similar if at most
+#maxDistance things differ: a sketch added, removed or recast, numBlocks, or one entry of a request list or setting.
+class SolutionCache:
+    PARAMETERS = ["maxChangesPerActor", "desiredFirstSketches", "desiredLastSketches", "nonAdjacentSketches", "differentBlockSketches",
+                  "blockStartingSketches", "requireNoAdjacentSmalls", "requireNoAdjacentBigs", "notInFirstBlock", "priority"]
+
+    def __init__(self, path = "showorderer_cache.json", maxEntries = 100, maxDistance = 3):
+        if not (isinstance(maxEntries, int) and maxEntries >= 1):
+            raise ValueError("maxEntries must be a positive integer")
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxDistance = maxDistance
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        while len(self.entries) > self.maxEntries:
+            del self.entries[min(self.entries, key = lambda key: self.entries[key]["lastUsed"])]
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.entries, f)
+        os.replace(self.path + ".tmp", self.path) #never leave a half-written cache behind
+
+    #canonical, JSON-friendly description of a show and its requests, and the hash that identifies it
+    @classmethod
+    def describe(cls, sketches, numBlocks, parameters):
+        show = {"numBlocks": numBlocks, "sketches": {}}
+        for sketch in sketches:
+            if isinstance(sketch, Vignettes):
+                show["sketches"][sketch.name] = ["vignettes", [sorted(actor.name for actor in actors) for actors in sketch.actors]]
+            else:
+                show["sketches"][sketch.name] = ["diddy" if isinstance(sketch, Diddy) else "sketch", sorted(actor.name for actor in sketch.actors)]
+        requests = {}
+        for name in cls.PARAMETERS:
+            value = parameters.get(name)
+            if isinstance(value, list):
+                value = sorted(sorted(item.name for item in entry) if isinstance(entry, (tuple, list)) else entry.name for entry in value)
+            requests[name] = value
+        key = hashlib.sha256(json.dumps([show, requests], sort_keys = True).encode()).hexdigest()
+        return key, show, requests
+
+    #how many things differ between two described shows
+    def _distance(self, show, requests, entry):
+        distance = 0 if show["numBlocks"] == entry["show"]["numBlocks"] else 1
+        for name in show["sketches"].keys() | entry["show"]["sketches"].keys():
+            if show["sketches"].get(name) != entry["show"]["sketches"].get(name):
+                distance += 1
+        for name in self.PARAMETERS:
+            value, cached = requests[name], entry["requests"].get(name) #caches written before a parameter existed don't have it
+            if isinstance(value, list) or isinstance(cached, list):
+                value = [json.dumps(item) for item in (value or [])]
+                cached = [json.dumps(item) for item in (cached or [])]
+                distance += len(set(value) ^ set(cached))
+            elif value != cached:
+                distance += 1
+        return distance
+
+    #the cached result for exactly this show and these requests, as a dict with "order", "score" and "status", or None
+    def get(self, sketches, numBlocks, parameters):
+        key, show, requests = self.describe(sketches, numBlocks, parameters)
+        if not (key in self.entries):
+            return None
+        self.entries[key]["lastUsed"] = time.time()
+        self._save()
+        return self.entries[key]
+
+    #the cached order of the most similar show, adjusted to fit this one (as a seedOrder), or None if nothing is similar enough
+    def nearest(self, sketches, numBlocks, parameters):
+        key, show, requests = self.describe(sketches, numBlocks, parameters)
+        distances = [(self._distance(show, requests, entry), cached) for (cached, entry) in self.entries.items()]
+        distances = [(distance, cached) for (distance, cached) in distances if distance <= self.maxDistance]
+        if len(distances) == 0:
+            return None
+        distance, cached = min(distances)
+        entry = self.entries[cached]
+        entry["lastUsed"] = time.time()
+        self._save()
+
+        #drop sketches that are gone and add new ones at the end; block separators only still fit if nothing moved between blocks
+        names = [name for sketch in sketches for (name, actors) in sketchItems(sketch)]
+        seedOrder = [name for name in entry["order"] if name in names or (name[:5] == "Block" and not (name in names))]
+        seedOrder.extend([name for name in names if not (name in seedOrder)])
+        if len(seedOrder) != len(entry["order"]) or numBlocks != entry["show"]["numBlocks"]:
+            seedOrder = [name for name in seedOrder if name in names]
+        return seedOrder
+
+    #remember an order for this show and these requests, unless a better one is already cached
+    def put(self, sketches, numBlocks, parameters, showOrder, score, status):
+        key, show, requests = self.describe(sketches, numBlocks, parameters)
+        if key in self.entries and self.entries[key]["score"] < score:
+            self.entries[key]["lastUsed"] = time.time()
+        else:
+            self.entries[key] = {"show": show, "requests": requests, "order": showOrder, "score": score, "status": status,
+                                 "lastUsed": time.time()}
+        self._save()
+
+def order(sketches, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches = None, desiredLastSketches = None, 
+          nonAdjacentSketches = None, differentBlockSketches = None, blockStartingSketches = None, requireNoAdjacentSmalls = False, 
+          requireNoAdjacentBigs = False, notInFirstBlock = None, timeout = 60, encoding = "int", backend = "z3",
+          seedOrder = None, workers = 1, k = 1, minDistance = 2, cache = None, objective = "soft", strategy = None, priority = None,
+          breakSymmetries = True):
+    #prints the order, and returns the ShowOrderer that made it: its order and status hold the result
+    #(and with k > 1, orders holds every (show order, score) found, best first)
+    print("Checking inputs...")
+    orderer = ShowOrderer(sketches)
+
+    #input checking: (sketches parameter is already checked by init of ShowOrderer class)
+    checkInputs(orderer.show, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock)
+    if not (encoding in ENCODINGS):
+        raise ValueError("encoding must be one of: " + ", ".join(ENCODINGS))
+    if not (backend in BACKENDS):
+        raise ValueError("backend must be one of: " + ", ".join(BACKENDS))
+    if not (isinstance(workers, int) and workers >= 1):
+        raise ValueError("workers must be a positive integer")
+    if not (isinstance(k, int) and k >= 1):
+        raise ValueError("k must be a positive integer")
+    if k > 1 and (backend != "z3" or workers > 1 or not (seedOrder is None)):
+        raise ValueError("k > 1 is only supported by the z3 backend with one worker and no seedOrder")
+    if not (cache is None) and not isinstance(cache, SolutionCache):
+        raise TypeError("cache must be a SolutionCache (or None)")
+    if not (objective in OBJECTIVES):
+        raise ValueError("objective must be one of: " + ", ".join(OBJECTIVES))
+    if not (strategy is None or strategy in MAXSAT_STRATEGIES):
+        raise ValueError("strategy must be one of: " + ", ".join(MAXSAT_STRATEGIES))
+    if not (priority in PRIORITIES):
+        raise ValueError("priority must be None, \"quickChanges\" or \"sizes\"")
+    if backend != "z3" and (objective != "soft" or not (strategy is None) or not (priority is None)):
+        raise ValueError("objective, strategy and priority are only supported by the z3 backend")
+    if not isinstance(breakSymmetries, bool):
+        raise TypeError("breakSymmetries must be True or False")
+
+    #catch requests that can't all hold before spending any time searching
+    problems = orderer.presolve(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                notInFirstBlock)
+    if len(problems) > 0:
+        raise orderer._conflict(problems)
+
+    #look for this show (or a similar one) in the cache
+    parameters = {"maxChangesPerActor": maxChangesPerActor, "desiredFirstSketches": desiredFirstSketches,
+                  "desiredLastSketches": desiredLastSketches, "nonAdjacentSketches": nonAdjacentSketches,
+                  "differentBlockSketches": differentBlockSketches, "blockStartingSketches": blockStartingSketches,
+                  "requireNoAdjacentSmalls": requireNoAdjacentSmalls, "requireNoAdjacentBigs": requireNoAdjacentBigs,
+                  "notInFirstBlock": notInFirstBlock, "priority": priority}
+    cached = None
+    if not (cache is None) and k == 1:
+        cached = cache.get(sketches, numBlocks, parameters)
+        if not (cached is None):
+            print("Found this show in the cache (" + ("best possible order" if cached["status"] == "optimal" else "best order found") + ").")
+        elif seedOrder is None:
+            seedOrder = cache.nearest(sketches, numBlocks, parameters)
+            if not (seedOrder is None):
+                print("Starting from the cached order of a similar show...")
+
     #create order
-    model = orderer.orderShow(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, 
-                              differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, 
-                              timeout * 1000)
+    if not (cached is None):
+        showOrder = cached["order"]
+        orderer.status = cached["status"]
+    elif k > 1:
+        orders = orderer.diverseOrders(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                       differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                       notInFirstBlock, timeout * 1000, k, minDistance, encoding, objective, strategy, priority,
+                                       breakSymmetries)
+        showOrder = None if len(orders) == 0 else orders[0][0]
+        orderer.orders = orders
+    elif backend == "local":
+        showOrder = orderer.searchShow(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, 
+                                       differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, 
+                                       notInFirstBlock, timeout * 1000, seedOrder = seedOrder)
+    elif backend == "decompose":
+        showOrder = orderer.decomposeShow(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, 
+                                          differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, 
+                                          notInFirstBlock, timeout * 1000, None if workers == 1 else workers)
+    elif workers > 1:
+        print("Searching for show order with " + str(workers) + " workers...")
+        engines = ["maxres", "wmax"] if strategy is None else [MAXSAT_STRATEGIES[strategy]]
+        showOrder, results = orderPortfolio(sketches, workers, timeout, [{"encoding": encoding, "maxsat_engine": engine} for engine in engines],
+                                            objective = objective, priority = priority, breakSymmetries = breakSymmetries, numBlocks = numBlocks,
+                                            maxChangesPerActor = maxChangesPerActor, desiredFirstSketches = desiredFirstSketches,
+                                            desiredLastSketches = desiredLastSketches, nonAdjacentSketches = nonAdjacentSketches,
+                                            differentBlockSketches = differentBlockSketches, blockStartingSketches = blockStartingSketches,
+                                            requireNoAdjacentSmalls = requireNoAdjacentSmalls, requireNoAdjacentBigs = requireNoAdjacentBigs,
+                                            notInFirstBlock = notInFirstBlock, seedOrder = seedOrder)
+        #a worker that proved its order optimal knows more than the lower bound does
+        if any(result["order"] is showOrder and result["status"] == "optimal" for result in results):
+            orderer.status = "optimal"
+    else:
+        print("Searching for show order...")
+        orderer.orderShow(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches, 
+                          differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock, 
+                          timeout * 1000, encoding, seedOrder = seedOrder, objective = objective, strategy = strategy, priority = priority,
+                          breakSymmetries = breakSymmetries)
+        showOrder = orderer.order
+
+    if orderer.status is None and k == 1:
+        orderer.status = orderer._status(None if showOrder is None else orderer.scoreOrder(showOrder),
+                                         orderer.lowerBound(numBlocks, nonAdjacentSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs),
+                                         priority = priority)
+    if not (cache is None) and cached is None and k == 1 and not (showOrder is None):
+        cache.put(sketches, numBlocks, parameters, showOrder, orderer.scoreOrder(showOrder), orderer.status)
 
     #print order
-    names = {}
-    for sketch in sketches:
-        if isinstance(sketch, Vignettes):
-            for i in range(len(sketch.actors)):
-                names[sketch.name + " " + str(i + 1)] = sketch.actors[i]
-        names[sketch.name] = sketch.actors
-    
-    orderer.print_order(model, names)
-    
-#------------------------------EXAMPLE: FALL 2024 SHOW------------------------------
-scott = Actor("Scott")
-vincent = Actor("Vincent")
-jesse = Actor("Jesse")
-john = Actor("John")
-edward = Actor("Edward")
-simon = Actor("Simon")
-fahran = Actor("Fahran")
-mira = Actor("Mira")
-
-bullies = Sketch("Bullies", [vincent, scott, jesse, john, edward])
-doordash = Vignettes("Doordash", [[simon, scott], [scott, jesse], [scott, edward]])
-call_me = Sketch("Here's my Number, so Call me Maybe", [john, mira, jesse, fahran])
-chiv = Sketch("Chivalry isn't Dead", [vincent, scott, edward, jesse])
-annapolis = Sketch("Annapolis", [edward, simon, john, jesse])
-rollcall = Sketch("Roll Call", [simon, edward, fahran, mira, john])
-cavemen = Sketch("Cavemen", [jesse, scott])
-funeral = Sketch("Funeral", [scott, vincent, fahran, mira, simon])
-fnaf = Sketch("Five Nights at Freddy's", [fahran, jesse, vincent, mira, john, simon])
-greats = Sketch("Literary Greats", [fahran, mira, vincent, simon, john])
-crossword = Sketch("Couples who Crossword", [fahran, simon, edward])
-incognito = Sketch("Incognito Mode", [john, fahran, vincent, jesse, scott])
-charlie = Sketch("A Very Charlie Brown Tax Season", [edward, mira, simon])
-giftshop = Sketch("Gift Shop", [jesse, fahran, scott, vincent, simon])
-tv = Diddy("TV", [edward, fahran])
-firemen = Sketch("Firemen", [jesse, mira, vincent, scott, john])
-
-
-sketches = [bullies, doordash, call_me, chiv, annapolis, rollcall, cavemen, funeral, fnaf, greats, crossword, incognito, charlie, giftshop,
-           tv, firemen]
-
-order(sketches, maxChangesPerActor = 1, desiredLastSketches = [rollcall], timeout = 60)
+    if k > 1:
+        for (i, (showOrder, score)) in enumerate(orders):
+            print("\n===============ORDER " + str(i + 1) + " (score " + str(score) + ")===============")
+            orderer.print_order(showOrder)
+        if len(orders) == 0:
+            orderer.print_order(None)
+        return orderer
+
+    orderer.order = showOrder
+    orderer.print_order(showOrder)
+    if not (showOrder is None):
+        score = orderer.scoreOrder(showOrder)
+        if orderer.status == "optimal":
+            print("\nScore: " + str(score) + " (the best possible)")
+        elif orderer.status.startswith("within "):
+            print("\nScore: " + str(score) + " (at most " + orderer.status.split(" ")[1] + " more than the best possible)")
+    return orderer
+
+#Like order(), but writes the model to path for another solver instead of searching (see ShowOrderer.exportModel for the formats).
+#Returns the ShowOrderer that wrote it; once the solver has run, its importSolution(path, solutionPath) gives the order to print_order
+def exportShow(sketches, path, numBlocks = 4, maxChangesPerActor = 3, desiredFirstSketches = None, desiredLastSketches = None,
+               nonAdjacentSketches = None, differentBlockSketches = None, blockStartingSketches = None, requireNoAdjacentSmalls = False,
+               requireNoAdjacentBigs = False, notInFirstBlock = None, encoding = None, format = None, objective = "soft", priority = None,
+               breakSymmetries = True):
+    orderer = ShowOrderer(sketches)
+    checkInputs(orderer.show, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock)
+    if not (encoding is None or encoding in ENCODINGS):
+        raise ValueError("encoding must be one of: " + ", ".join(ENCODINGS))
+    if not (objective in OBJECTIVES):
+        raise ValueError("objective must be one of: " + ", ".join(OBJECTIVES))
+    if not (priority in PRIORITIES):
+        raise ValueError("priority must be None, \"quickChanges\" or \"sizes\"")
+    if not isinstance(breakSymmetries, bool):
+        raise TypeError("breakSymmetries must be True or False")
+    problems = orderer.presolve(numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                                differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs,
+                                notInFirstBlock)
+    if len(problems) > 0:
+        raise orderer._conflict(problems)
+
+    orderer.exportModel(path, numBlocks, maxChangesPerActor, desiredFirstSketches, desiredLastSketches, nonAdjacentSketches,
+                        differentBlockSketches, blockStartingSketches, requireNoAdjacentSmalls, requireNoAdjacentBigs, notInFirstBlock,
+                        encoding, format, objective, priority, breakSymmetries)
+    return orderer
+
+#A show that stays encoded between solves, for ordering meetings where the director changes one thing at a time.
+#The base model (positions, blocks, quick changes, vignettes/diddies) is encoded once. Every request (first/last sketches,
+#non-adjacent pairs, different blocks, block starts, not in first block, max changes per actor, no adjacent bigs/smalls) is
+#added once behind its own on/off switch and only switched on while it is part of the current parameters, so changing a request
+#never re-encodes anything. Each solve starts from the previous best order, which is kept if the solver can't beat it.
+#
+#Usage:
+#    session = ShowSession(sketches, numBlocks = 4, maxChangesPerActor = 3)
+#    session.solve(timeout = 30)
+#    session.update(desiredLastSketches = [rollcall])     #put Roll Call last
+#    session.add("notInFirstBlock", cavemen)               #keep Cavemen out of block 1
+#    session.update(maxChangesPerActor = 2)
+#    session.solve(timeout = 10)
+class ShowSession:
+    PARAMETERS = ["maxChangesPerActor", "desiredFirstSketches", "desiredLastSketches", "nonAdjacentSketches",
+                  "differentBlockSketches", "blockStartingSketches", "requireNoAdjacentSmalls", "requireNoAdjacentBigs",
+                  "notInFirstBlock"]
+
+    def __init__(self, sketches, numBlocks = 4, encoding = "bool", **parameters):
+        self.orderer = ShowOrderer(sketches)
+        self.sketchList = sketches
+        self.numBlocks = numBlocks
+        self.encodingName = encoding
+        self.parameters = {"maxChangesPerActor": 3, "desiredFirstSketches": None, "desiredLastSketches": None,
+                           "nonAdjacentSketches": None, "differentBlockSketches": None, "blockStartingSketches": None,
+                           "requireNoAdjacentSmalls": False, "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+        self.update(**parameters)
+
+        print("Encoding constraints...")
+        self.solver = Optimize()
+        self.encoding = self.orderer._encodeShow(self.solver, numBlocks, encoding)
+        self.switches = {} #request label -> z3 Bool that switches that request on
+        self.order = None
+        self.status = None
+
+    #replace parameters with new values; None removes a list of requests entirely
+    def update(self, **parameters):
+        for name in parameters:
+            if not (name in self.PARAMETERS):
+                raise ValueError(name + " is not a parameter that can be changed during a session")
+        newParameters = dict(self.parameters)
+        newParameters.update(parameters)
+        checkInputs(self.orderer.show, self.numBlocks, **newParameters)
+        self.parameters = newParameters
+
+    #add one sketch (or pair of sketches) to a list parameter, e.g. add("notInFirstBlock", cavemen)
+    def add(self, name, value):
+        current = self.parameters.get(name)
+        if not (current is None or isinstance(current, list)):
+            raise ValueError(name + " is not a list of sketches")
+        self.update(**{name: (current or []) + [value]})
+
+    #remove one sketch (or pair of sketches) from a list parameter
+    def remove(self, name, value):
+        current = self.parameters.get(name)
+        if not (isinstance(current, list) and value in current):
+            raise ValueError("That request is not part of " + name)
+        remaining = [other for other in current if not (other is value or other == value)]
+        self.update(**{name: remaining if len(remaining) > 0 else None})
+
+    #switches for every request in the current parameters, encoding requests the first time they are seen
+    def _assumptions(self):
+        requests = self.orderer._userConstraints(self.encoding, self.numBlocks, **self.parameters)
+        assumptions = []
+        for (label, constraints) in requests:
+            if not (label in self.switches):
+                self.switches[label] = Bool(label)
+                self.solver.add(Implies(self.switches[label], And(constraints)))
+            assumptions.append(self.switches[label])
+        return assumptions
+
+    #search for the best order under the current parameters, starting from the previous best order
+    def solve(self, timeout = 60):
+        problems = self.orderer.presolve(self.numBlocks, **self.parameters)
+        if len(problems) > 0:
+            raise self.orderer._conflict(problems)
+        assumptions = self._assumptions()
+        self.solver.set("timeout", timeout * 1000)
+
+        previousScore = None
+        if not (self.order is None):
+            for (var, value) in self.encoding.initialValues(self.order):
+                self.solver.set_initial_value(var, value)
+            search = self.orderer._localSearch(self.numBlocks, **self.parameters)
+            soft, hard, changes = search.evaluate(search.encode(self.order))
+            if hard == 0:
+                previousScore = soft
+
+        print("Searching for show order...")
+        result = self.solver.check(*assumptions)
+        if result == unsat:
+            print("Looking for the conflicting requests...")
+            raise self.orderer._conflict(core = self.orderer.explainConflict(self.numBlocks, timeout = timeout * 1000,
+                                                                            encoding = self.encodingName, **self.parameters))
+        try:
+            showOrder = self.encoding.decode(self.solver.model())
+        except Z3Exception:
+            showOrder = None #ran out of time before finding any order
+        if showOrder is None or (not (previousScore is None) and self.orderer.scoreOrder(showOrder) > previousScore):
+            #nothing better within the time limit; keep the previous order if it still meets every requirement
+            showOrder = self.order if not (previousScore is None) else None
+        self.order = showOrder
+        bound = self.orderer.lowerBound(self.numBlocks, self.parameters["nonAdjacentSketches"],
+                                        self.parameters["requireNoAdjacentSmalls"], self.parameters["requireNoAdjacentBigs"])
+        self.status = self.orderer._status(None if showOrder is None else self.orderer.scoreOrder(showOrder), bound, result == sat)
+        return self.order
+
+    def print_order(self):
+        self.orderer.print_order(self.order)
+
+#One solve in a portfolio, run in its own process with its own shuffle and z3 random seed
+#Stops early (keeping the best order so far) as soon as stopEvent is set by another worker that proved its order optimal
+def _portfolioWorker(sketches, orderArgs, config, seed, deadline, stopEvent):
+    numpy.random.seed(seed)
+    config = dict(config)
+    encoding = config.pop("encoding", "int")
+    config["random_seed"] = seed
+    orderer = ShowOrderer(sketches)
+
+    finished = threading.Event()
+    def watch():
+        while not finished.is_set():
+            if stopEvent.is_set() or time.time() >= deadline:
+                main_ctx().interrupt()
+                return
+            finished.wait(0.2)
+    watcher = threading.Thread(target = watch, daemon = True)
+    watcher.start()
+
+    result = {"seed": seed, "encoding": encoding, "options": config, "order": None, "objective": None}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            timeout = max(1, int((deadline - time.time()) * 1000))
+            orderer.orderShow(timeout = timeout, encoding = encoding, solverOptions = config, **orderArgs)
+        result["status"] = orderer.status
+        result["order"] = orderer.order
+        if not (orderer.order is None):
+            result["objective"] = orderer.scoreOrder(orderer.order)
+    except Exception as e:
+        if not str(e).startswith("There are no show orders"):
+            raise
+        result["status"] = "unsat"
+        result["error"] = str(e)
+    finally:
+        finished.set()
+    return result
+
+#Runs several independent orderShow solves at once in a process pool and returns (best show order, result of every worker)
+#timeout is in seconds of wall clock time for the whole portfolio. Each worker gets its own shuffle and z3 random seed, and cycles through configs (dicts with an optional "encoding" plus any
+#z3 Optimize options, e.g. {"encoding": "bool", "maxsat_engine": "wmax"}). The remaining workers stop early once one proves its
+#order is optimal. orderArgs are orderShow's arguments (numBlocks, maxChangesPerActor, desiredFirstSketches, ...).
+def orderPortfolio(sketches, workers = None, timeout = 60, configs = None, **orderArgs):
+    if workers is None:
+        workers = os.cpu_count()
+    if configs is None:
+        configs = [{"maxsat_engine": "maxres"}, {"maxsat_engine": "wmax"}]
+    args = {"numBlocks": 4, "maxChangesPerActor": 3, "desiredFirstSketches": None, "desiredLastSketches": None,
+            "nonAdjacentSketches": None, "differentBlockSketches": None, "blockStartingSketches": None,
+            "requireNoAdjacentSmalls": False, "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+    args.update(orderArgs)
+    seeds = random.Random().sample(range(1, 2**31), workers)
+    deadline = time.time() + timeout #shared by every worker, so encoding time counts against the limit too
+
+    results = []
+    with multiprocessing.Manager() as manager:
+        stopEvent = manager.Event()
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(_portfolioWorker, sketches, args, configs[i % len(configs)], seeds[i], deadline, stopEvent)
+                       for i in range(workers)]
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+                if results[-1]["status"] in ["optimal", "unsat"]:
+                    stopEvent.set()
+
+    for result in results:
+        if result["status"] == "unsat":
+            raise Exception(result["error"])
+    found = [result for result in results if not (result["order"] is None)]
+    if len(found) == 0:
+        return None, results
+    priority = args.get("priority")
+    if priority is None:
+        best = min(found, key = lambda result: (result["status"] != "optimal", result["objective"]))
+    else:
+        scorer = ShowOrderer(sketches)
+        best = min(found, key = lambda result: (result["status"] != "optimal", scorer._objectiveKey(result["order"], priority)))
+    return best["order"], results
+
+#Runs the same show through every encoding and reports how quickly each one finds its first valid order and how good its final order is
+#Takes the same arguments as order(); objectives are scored by ShowOrderer.scoreOrder so the encodings can be compared directly
+def benchmarkEncodings(sketches, timeout = 60, **orderArgs):
+    results = []
+    for encoding in ENCODINGS:
+        orderer = ShowOrderer(sketches)
+        firstSolution = []
+        start = time.perf_counter()
+        def onModel(model):
+            if len(firstSolution) == 0:
+                firstSolution.append(time.perf_counter() - start)
+        args = {"numBlocks": 4, "maxChangesPerActor": 3, "desiredFirstSketches": None, "desiredLastSketches": None,
+                "nonAdjacentSketches": None, "differentBlockSketches": None, "blockStartingSketches": None,
+                "requireNoAdjacentSmalls": False, "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+        args.update(orderArgs)
+        orderer.orderShow(timeout = timeout * 1000, encoding = encoding, onModel = onModel, **args)
+        showOrder = orderer.order
+        results.append({"encoding": encoding,
+                        "firstSolution": firstSolution[0] if len(firstSolution) > 0 else None,
+                        "total": time.perf_counter() - start,
+                        "objective": None if showOrder is None else orderer.scoreOrder(showOrder)})
+
+    print("")
+    print("encoding  first solution (s)  total (s)  objective")
+    for result in results:
+        first = "-" if result["firstSolution"] is None else "%.2f" % result["firstSolution"]
+        objective = "-" if result["objective"] is None else str(result["objective"])
+        print("%-8s  %18s  %9.2f  %9s" % (result["encoding"], first, result["total"], objective))
+    return results
+
+#Runs the same show through the z3 backend with different ways of optimizing (configs is a list of dicts with any of orderShow's
+#objective, strategy and priority; by default soft constraints and the pseudo-boolean objective under every strategy, plus each
+#priority) and reports how quickly each one finds its first valid order, how good its final order is, and whether it proved it best.
+#Takes the same arguments as order(); every order is scored by ShowOrderer.scoreParts, so the configs can be compared directly
+def benchmarkObjectives(sketches, timeout = 60, configs = None, **orderArgs):
+    if configs is None:
+        configs = [{"objective": "soft", "strategy": strategy} for strategy in ["maxres", "wmax"]]
+        configs.extend({"objective": "minimize", "strategy": strategy} for strategy in MAXSAT_STRATEGIES)
+        configs.extend({"objective": "minimize", "priority": priority} for priority in PRIORITIES if not (priority is None))
+    args = {"numBlocks": 4, "maxChangesPerActor": 3, "desiredFirstSketches": None, "desiredLastSketches": None,
+            "nonAdjacentSketches": None, "differentBlockSketches": None, "blockStartingSketches": None,
+            "requireNoAdjacentSmalls": False, "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+    args.update(orderArgs)
+    results = []
+    for config in configs:
+        orderer = ShowOrderer(sketches)
+        firstSolution = []
+        start = time.perf_counter()
+        def onModel(model):
+            if len(firstSolution) == 0:
+                firstSolution.append(time.perf_counter() - start)
+        with contextlib.redirect_stdout(io.StringIO()):
+            orderer.orderShow(timeout = timeout * 1000, onModel = onModel, **config, **args)
+        showOrder = orderer.order
+        result = {"objective": config.get("objective", "soft"), "strategy": config.get("strategy"), "priority": config.get("priority"),
+                  "firstSolution": firstSolution[0] if len(firstSolution) > 0 else None,
+                  "total": time.perf_counter() - start,
+                  "status": orderer.status,
+                  "score": None, "quickChanges": None, "sizes": None}
+        if not (showOrder is None):
+            result["quickChanges"], result["sizes"] = orderer.scoreParts(showOrder)
+            result["score"] = result["quickChanges"] + result["sizes"]
+        results.append(result)
+
+    print("")
+    print("objective  strategy  priority      first solution (s)  total (s)  score  quick changes  sizes  status")
+    for result in results:
+        first = "-" if result["firstSolution"] is None else "%.2f" % result["firstSolution"]
+        parts = ["-" if result[key] is None else str(result[key]) for key in ["score", "quickChanges", "sizes"]]
+        print("%-9s  %-8s  %-12s  %18s  %9.2f  %5s  %13s  %5s  %s" % (result["objective"], result["strategy"] or "maxres",
+                                                                     result["priority"] or "-", first, result["total"],
+                                                                     parts[0], parts[1], parts[2], result["status"]))
+    return results
+
+#Runs the same show with and without symmetry breaking and reports what symmetries were found, how quickly each run found its first
+#and its final order, how good that order is, and whether it was proven best (the sooner a run says "optimal", the better).
+#Takes the same arguments as order()
+def benchmarkSymmetries(sketches, timeout = 60, **orderArgs):
+    args = {"numBlocks": 4, "maxChangesPerActor": 3, "desiredFirstSketches": None, "desiredLastSketches": None,
+            "nonAdjacentSketches": None, "differentBlockSketches": None, "blockStartingSketches": None,
+            "requireNoAdjacentSmalls": False, "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+    args.update(orderArgs)
+    results = []
+    for breakSymmetries in [False, True]:
+        orderer = ShowOrderer(sketches)
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = orderer.orderShow(timeout = timeout * 1000, breakSymmetries = breakSymmetries, **args)
+        results.append({"breakSymmetries": breakSymmetries,
+                        "firstSolution": report.improvements[0][0] if len(report.improvements) > 0 else None,
+                        "bestSolution": report.improvements[-1][0] if len(report.improvements) > 0 else None,
+                        "total": report.encodeTime + report.searchTime,
+                        "score": report.objective,
+                        "status": report.status})
+
+    interchangeable, permutableBlocks, reversibleBlocks = orderer.symmetries(args["numBlocks"], args["desiredFirstSketches"],
+                                                                             args["desiredLastSketches"], args["nonAdjacentSketches"],
+                                                                             args["differentBlockSketches"], args["blockStartingSketches"],
+                                                                             args["notInFirstBlock"])
+    print("")
+    print("interchangeable: " + ("; ".join(", ".join(group) for group in interchangeable) or "none"))
+    print("permutable blocks: " + (", ".join(str(blockNum + 1) for blockNum in permutableBlocks) or "none"))
+    print("reversible blocks: " + (", ".join(str(blockNum + 1) for blockNum in reversibleBlocks) or "none"))
+    print("symmetry breaking  first solution (s)  best solution (s)  total (s)  score  status")
+    for result in results:
+        first = "-" if result["firstSolution"] is None else "%.2f" % result["firstSolution"]
+        best = "-" if result["bestSolution"] is None else "%.2f" % result["bestSolution"]
+        score = "-" if result["score"] is None else str(result["score"])
+        print("%-17s  %18s  %17s  %9.2f  %5s  %s" % ("on" if result["breakSymmetries"] else "off", first, best, result["total"], score,
+                                                    result["status"]))
+    return results
+
+#Make up a random show to benchmark with. Returns the sketches and the order() arguments to go with them.
+#Regular sketches get between actorsPerSketch[0] and actorsPerSketch[1] actors from a cast of castSize, every set of vignettes has
+#vignettesPerSet vignettes of 2 actors, and diddies have 2 actors. constraintDensity (0 to 1) is the chance that there is a desired
+#first and a desired last sketch, and the number of nonadjacent and different block pairs per regular sketch.
+def generateShow(numSketches = 16, castSize = 8, actorsPerSketch = (2, 6), numVignetteSets = 1, vignettesPerSet = 3, numDiddies = 1,
+                 numBlocks = 4, constraintDensity = 0.1, maxChangesPerActor = 3, seed = None):
+    if numVignetteSets * vignettesPerSet > numBlocks or numDiddies > numBlocks:
+        raise ValueError("There can be at most one vignette and one diddy per block")
+    if actorsPerSketch[1] > castSize:
+        raise ValueError("actorsPerSketch can't be more than castSize")
+    rng = random.Random(seed)
+    cast = [Actor("Actor " + str(i + 1)) for i in range(castSize)]
+
+    regulars = [Sketch("Sketch " + str(i + 1), rng.sample(cast, rng.randint(actorsPerSketch[0], actorsPerSketch[1])))
+                for i in range(numSketches)]
+    sketches = list(regulars)
+    for i in range(numVignetteSets):
+        sketches.append(Vignettes("Vignettes " + str(i + 1), [rng.sample(cast, 2) for j in range(vignettesPerSet)]))
+    for i in range(numDiddies):
+        sketches.append(Diddy("Diddy " + str(i + 1), rng.sample(cast, 2)))
+
+    picked = rng.sample(regulars, 2)
+    numPairs = int(round(constraintDensity * numSketches))
+    orderArgs = {"numBlocks": numBlocks, "maxChangesPerActor": maxChangesPerActor,
+                 "desiredFirstSketches": [picked[0]] if rng.random() < constraintDensity else None,
+                 "desiredLastSketches": [picked[1]] if rng.random() < constraintDensity else None,
+                 "nonAdjacentSketches": [tuple(rng.sample(regulars, 2)) for i in range(numPairs)] or None,
+                 "differentBlockSketches": [tuple(rng.sample(regulars, 2)) for i in range(numPairs)] or None}
+    return (sketches, orderArgs)
+
+#Run every backend (and every encoding of the z3 backend) on a grid of generated shows, and write one JSON object per run to outputFile,
+#so runs can be compared over time. grid maps generateShow arguments to the values to try, e.g. {"numSketches": [12, 24], "castSize": [8]};
+#every combination is tried with showsPerPoint different random shows.
+def benchmarkSuite(grid = None, backends = None, timeout = 60, showsPerPoint = 1, outputFile = "benchmark.jsonl", seed = 0):
+    if grid is None:
+        grid = {"numSketches": [12, 16, 24], "constraintDensity": [0, 0.2]}
+    runs = []
+    for backend in (backends or BACKENDS):
+        if backend == "z3":
+            runs.extend([(backend, encoding) for encoding in ENCODINGS])
+        elif backend in BACKENDS:
+            runs.append((backend, None))
+        else:
+            raise ValueError("backend must be one of: " + ", ".join(BACKENDS))
+
+    results = []
+    showNum = 0
+    for values in itertools.product(*grid.values()):
+        showArgs = dict(zip(grid.keys(), values))
+        for i in range(showsPerPoint):
+            showNum += 1
+            sketches, orderArgs = generateShow(seed = seed + showNum, **showArgs)
+            for (backend, encoding) in runs:
+                result = dict(showArgs)
+                result.update({"show": seed + showNum, "backend": backend, "encoding": encoding, "timeout": timeout})
+                orderer = ShowOrderer(sketches)
+                args = {"desiredFirstSketches": None, "desiredLastSketches": None, "nonAdjacentSketches": None,
+                        "differentBlockSketches": None, "blockStartingSketches": None, "requireNoAdjacentSmalls": False,
+                        "requireNoAdjacentBigs": False, "notInFirstBlock": None}
+                args.update(orderArgs)
+                firstFeasible = []
+                start = time.perf_counter()
+                def onFeasible(*found):
+                    if len(firstFeasible) == 0:
+                        firstFeasible.append(time.perf_counter() - start)
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if backend == "local":
+                            showOrder = orderer.searchShow(timeout = timeout * 1000, onImprove = onFeasible, **args)
+                        elif backend == "decompose":
+                            showOrder = orderer.decomposeShow(timeout = timeout * 1000, onImprove = onFeasible, **args)
+                        else:
+                            orderer.orderShow(timeout = timeout * 1000, encoding = encoding, onModel = onFeasible, **args)
+                            showOrder = orderer.order
+                    status = "timeout" if showOrder is None else "sat"
+                except Z3Exception:
+                    showOrder = None #ran out of time before z3 had any model to give
+                    status = "timeout"
+                except Exception as e:
+                    if not ("no show orders" in str(e)):
+                        raise
+                    showOrder = None
+                    status = "unsat"
+                changes = None if showOrder is None else orderer.quickChanges(showOrder)
+                result.update({"status": status,
+                               "optimal": status == "sat" and orderer.status == "optimal",
+                               "encodeTime": orderer.encodeTime,
+                               "firstFeasible": firstFeasible[0] if len(firstFeasible) > 0 else None,
+                               "total": time.perf_counter() - start,
+                               "objective": None if showOrder is None else orderer.scoreOrder(showOrder),
+                               "quickChanges": changes})
+                results.append(result)
+                with open(outputFile, "a") as f:
+                    f.write(json.dumps(result) + "\n") #write as we go, so an interrupted run keeps its results
+                print("show %3d  %-9s  %-4s  %-7s  objective %s" % (result["show"], backend, encoding or "", status,
+                                                                     "-" if result["objective"] is None else result["objective"]))
+    return results
+
+#------------------------------SHOW SPECS, BATCHES AND COMMAND LINE------------------------------
+#A show spec is a JSON (or TOML) object with a "sketches" list and any of order()'s parameters, naming sketches by name:
+#    {"name": "Fall 2024",
+#     "sketches": [{"name": "Bullies", "actors": ["Vincent", "Scott", "Jesse", "John", "Edward"]},
+#                  {"name": "Doordash", "type": "vignettes", "actors": [["Simon", "Scott"], ["Scott", "Jesse"]]},
+#                  {"name": "TV", "type": "diddy", "actors": ["Edward", "Fahran"]}, ...],
+#     "maxChangesPerActor": 1, "desiredLastSketches": ["Roll Call"], "nonAdjacentSketches": [["Bullies", "TV"]], "timeout": 60}
+#See fall2024.json for a full one.
+SPEC_PARAMETERS = ["numBlocks", "maxChangesPerActor", "desiredFirstSketches", "desiredLastSketches", "nonAdjacentSketches",
+                   "differentBlockSketches", "blockStartingSketches", "requireNoAdjacentSmalls", "requireNoAdjacentBigs",
+                   "notInFirstBlock", "timeout", "encoding", "backend", "seedOrder", "workers", "k", "minDistance", "objective", "strategy",
+                   "priority", "breakSymmetries"]
+
+#Read a show spec from a .json or .toml file (or take an already parsed dict). Returns (name, sketches, order() arguments).
+def loadSpec(source):
+    name = None
+    if isinstance(source, str):
+        name = os.path.splitext(os.path.basename(source))[0]
+        if source.endswith(".toml"):
+            try:
+                import tomllib
+            except ImportError:
+                raise ValueError("Reading TOML show specs needs Python 3.11 or newer; use JSON instead")
+            with open(source, "rb") as f:
+                source = tomllib.load(f)
+        else:
+            with open(source) as f:
+                source = json.load(f)
+    if not isinstance(source, dict):
+        raise TypeError("A show spec must be a JSON object")
+    for key in source:
+        if not (key in SPEC_PARAMETERS or key in ["name", "sketches"]):
+            raise ValueError(key + " is not something a show spec can have")
+    if not isinstance(source.get("sketches"), list):
+        raise ValueError("A show spec needs a list of sketches")
+
+    #one Actor per name, so the same actor in different sketches is one person
+    actors = {}
+    def actor(actorName):
+        if not (actorName in actors):
+            actors[actorName] = Actor(actorName)
+        return actors[actorName]
+
+    sketches = []
+    byName = {}
+    for entry in source["sketches"]:
+        kind = entry.get("type", "sketch")
+        if kind == "vignettes":
+            sketch = Vignettes(entry["name"], [[actor(actorName) for actorName in vignette] for vignette in entry["actors"]])
+        elif kind in ["sketch", "diddy"]:
+            sketch = (Diddy if kind == "diddy" else Sketch)(entry["name"], [actor(actorName) for actorName in entry["actors"]])
+        else:
+            raise ValueError("The type of " + str(entry.get("name")) + " must be \"sketch\", \"vignettes\" or \"diddy\"")
+        sketches.append(sketch)
+        byName[sketch.name] = sketch
+
+    def lookup(sketchName):
+        if not (sketchName in byName):
+            raise ValueError(str(sketchName) + " is not one of the sketches in the spec")
+        return byName[sketchName]
+
+    orderArgs = {}
+    for key in SPEC_PARAMETERS:
+        if not (key in source) or source[key] is None:
+            continue
+        value = source[key]
+        if key in ["desiredFirstSketches", "desiredLastSketches", "blockStartingSketches", "notInFirstBlock"]:
+            value = [lookup(sketchName) for sketchName in value]
+        elif key in ["nonAdjacentSketches", "differentBlockSketches"]:
+            value = [(lookup(pair[0]), lookup(pair[1])) for pair in value]
+        orderArgs[key] = value
+    return (source.get("name", name), sketches, orderArgs)
+
+#Order one spec in a batch worker process and return a JSON-friendly result (order() doesn't get to print anything)
+def _orderSpec(source, timeout):
+    start = time.perf_counter()
+    result = {"name": source if isinstance(source, str) else source.get("name")}
+    try:
+        name, sketches, orderArgs = loadSpec(source)
+        result["name"] = name
+        if not (timeout is None):
+            orderArgs["timeout"] = timeout
+        with contextlib.redirect_stdout(io.StringIO()):
+            orderer = order(sketches, **orderArgs)
+        result["status"] = orderer.status or "timeout"
+        result["order"] = orderer.order
+        if orderArgs.get("k", 1) > 1:
+            result["orders"] = [{"order": showOrder, "score": score} for (showOrder, score) in orderer.orders]
+        if not (orderer.order is None):
+            result["score"] = orderer.scoreOrder(orderer.order)
+            result["quickChanges"] = orderer.quickChanges(orderer.order)
+    except Exception as e:
+        result["status"] = "unsat" if str(e).startswith("There are no show orders") else "error"
+        result["error"] = str(e)
+    result["time"] = time.perf_counter() - start
+    return result
+
+#Run work(spec, *args) for every spec in a process pool, taking specs from the iterable only as workers free up (at most two per
+#worker started and not yet done), so specs arriving on standard input start as soon as they are read. A spec that is an exception
+#(a line that couldn't be read) becomes an error result. Every result is written to output as one JSON line as soon as it is done,
+#even while the next spec is still being waited for.
+def _runBatch(specs, work, args, workers, output):
+    workers = workers or os.cpu_count()
+    results = []
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(2 * workers)
+    def finish(result):
+        with lock:
+            results.append(result)
+            if not (output is None):
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    def done(spec, future):
+        try:
+            finish(future.result())
+        except Exception as e:
+            #the worker itself failed (e.g. its process died), so work never got to turn this into an error result
+            finish({"name": spec if isinstance(spec, str) else spec.get("name"), "status": "error", "error": repr(e)})
+        finally:
+            slots.release()
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for spec in specs:
+            if isinstance(spec, Exception):
+                finish({"name": None, "status": "error", "error": str(spec)})
+                continue
+            slots.acquire()
+            pool.submit(work, spec, *args).add_done_callback(functools.partial(done, spec))
+    return results
+
+#Order many shows at once, workers at a time (one per CPU core by default). specs are spec file paths or parsed specs, in a list or
+#any other iterable (read as the shows get ordered); timeout (seconds) overrides every spec's own timeout. Writes one JSON line per
+#show to output as soon as it is done, and returns the results in the order they finished.
+def orderBatch(specs, workers = None, timeout = None, output = None):
+    return _runBatch(specs, _orderSpec, (timeout,), workers, output)
+
+#the spec parameters exportShow takes; the rest (timeout, backend, workers, ...) are about searching
+EXPORT_PARAMETERS = ["numBlocks", "maxChangesPerActor", "desiredFirstSketches", "desiredLastSketches", "nonAdjacentSketches",
+                     "differentBlockSketches", "blockStartingSketches", "requireNoAdjacentSmalls", "requireNoAdjacentBigs",
+                     "notInFirstBlock", "encoding", "objective", "priority", "breakSymmetries"]
+
+#Export one spec in a batch worker process to directory/<show name>.<format> and return a JSON-friendly result
+def _exportSpec(source, format, directory):
+    start = time.perf_counter()
+    result = {"name": source if isinstance(source, str) else source.get("name")}
+    try:
+        name, sketches, orderArgs = loadSpec(source)
+        result["name"] = name
+        path = os.path.join(directory, str(name).replace(os.sep, "_") + "." + format)
+        exportShow(sketches, path, format = format, **{key: value for (key, value) in orderArgs.items() if key in EXPORT_PARAMETERS})
+        result["status"] = "exported"
+        result["path"] = path
+    except Exception as e:
+        result["status"] = "unsat" if str(e).startswith("There are no show orders") else "error"
+        result["error"] = str(e)
+    result["time"] = time.perf_counter() - start
+    return result
+
+#Export many shows at once for solving elsewhere, the way orderBatch orders them: one file per show in directory, named after the
+#show, and one JSON line per show written to output as soon as it is done. Returns the results in the order they finished.
+def exportBatch(specs, format, directory = ".", workers = None, output = None):
+    if not (format in EXPORT_FORMATS.values()):
+        raise ValueError("format must be one of: " + ", ".join(EXPORT_FORMATS.values()))
+    os.makedirs(directory, exist_ok = True)
+    return _runBatch(specs, _exportSpec, (format, directory), workers, output)
+
+#Spec files named on the command line: directories stand for every .json and .toml file in them, and "-" reads one JSON spec
+#per line from standard input, as it arrives (a line that isn't JSON comes out as a ValueError saying so)
+def _specSources(paths):
+    for path in paths:
+        if path == "-":
+            for (lineNum, line) in enumerate(sys.stdin):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield ValueError("Line " + str(lineNum + 1) + " of standard input is not a JSON spec: " + str(e))
+        elif os.path.isdir(path):
+            for fileName in sorted(os.listdir(path)):
+                if fileName.endswith(".json") or fileName.endswith(".toml"):
+                    yield os.path.join(path, fileName)
+        else:
+            yield path
+
+#python ShowOrderer.py [spec files, directories or -] [--workers N] [--timeout SECONDS] [--output FILE]
+#                      [--export smt2|wcnf|opb] [--export-dir DIRECTORY]
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Order sketch shows from JSON or TOML show specs, several at once.")
+    parser.add_argument("specs", nargs = "+", help = "spec files, directories of spec files, or - to read JSON specs (one per line) from stdin")
+    parser.add_argument("--workers", type = int, default = None, help = "shows to order at the same time (default: one per CPU core)")
+    parser.add_argument("--timeout", type = int, default = None, help = "seconds per show, instead of each spec's own timeout")
+    parser.add_argument("--output", default = None, help = "file to write JSON lines to (default: standard output)")
+    parser.add_argument("--export", default = None, choices = list(EXPORT_FORMATS.values()),
+                        help = "write every show's model in this format instead of ordering it")
+    parser.add_argument("--export-dir", default = ".", help = "directory to write exported models to (default: the current one)")
+    args = parser.parse_args(argv)
+
+    def run(output):
+        if args.export is None:
+            orderBatch(_specSources(args.specs), args.workers, args.timeout, output)
+        else:
+            exportBatch(_specSources(args.specs), args.export, args.export_dir, args.workers, output)
+
+    if args.output is None:
+        run(sys.stdout)
+    else:
+        with open(args.output, "w") as output:
+            run(output)
+
+if __name__ == "__main__":
+    main()